@@ -0,0 +1,138 @@
+"""
+Бенчмарк разбиения текста: общий движок chunking против старых функций
+split_text из pars_pdf.py и load_book.py.
+
+Перед замером прогоняется проверка свойств движка на случайных текстах:
+ни один чанк не длиннее бюджета, без перекрытия слова не теряются и
+не дублируются, перекрытие не превышает заданного.
+
+Запуск из корня проекта:
+    python bench/bench_chunking.py
+    python bench/bench_chunking.py --sizes 10000 100000 1000000 --max-length 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunking import chunk_pages, split_text, token_length
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chunks.txt")
+
+
+# Копии старых реализаций — эталон для сравнения скорости
+def legacy_split_text_newline(text: str, max_length: int = 1000) -> list:
+    chunks = []
+    while len(text) > max_length:
+        split_index = text.rfind("\n", 0, max_length)
+        if split_index == -1:
+            split_index = max_length
+        chunk = text[:split_index].strip()
+        chunks.append(chunk)
+        text = text[split_index:].strip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def legacy_split_text_space(text: str, max_length: int = 1000) -> list:
+    chunks = []
+    while len(text) > max_length:
+        split_index = text.rfind(" ", 0, max_length)
+        if split_index == -1:
+            split_index = max_length
+        chunk = text[:split_index].strip()
+        chunks.append(chunk)
+        text = text[split_index:].strip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def load_words() -> list:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return f.read().split()
+
+
+def make_text(words: list, size: int, rng: random.Random) -> str:
+    parts = []
+    total = 0
+    while total < size:
+        word = rng.choice(words)
+        parts.append(word)
+        total += len(word) + 1
+        if rng.random() < 0.02:
+            parts.append("\n")
+    return " ".join(parts)[:size]
+
+
+def check_invariants(words: list, rounds: int = 300, seed: int = 0):
+    rng = random.Random(seed)
+    for _ in range(rounds):
+        text = make_text(words, rng.randint(0, 5000), rng)
+        if rng.random() < 0.1:
+            text += " " + "x" * rng.randint(1, 3000)
+        max_length = rng.randint(10, 1200)
+        overlap = rng.choice([0, rng.randint(0, max_length - 1)])
+        sentence_aware = rng.random() < 0.5
+
+        chunks = split_text(text, max_length, overlap, sentence_aware)
+        for chunk in chunks:
+            assert len(chunk) <= max_length, "чанк длиннее бюджета"
+            assert chunk == chunk.strip() and chunk, "пустой чанк или пробелы по краям"
+        if overlap == 0:
+            assert "".join("".join(chunks).split()) == "".join(text.split()), "потеряны или повторены слова"
+
+        token_chunks = split_text(text, 50, 0, sentence_aware, token_length)
+        assert all(len(chunk.split()) <= 50 for chunk in token_chunks), "чанк длиннее бюджета в токенах"
+
+        # Потоковый режим по страницам: номера страниц не убывают
+        pages = [(i + 1, page) for i, page in enumerate(text.split("\n"))]
+        previous = 0
+        for chunk in chunk_pages(pages, max_length, overlap, sentence_aware):
+            assert chunk.page_start <= chunk.page_end
+            assert chunk.page_start >= previous
+            previous = chunk.page_start
+    print(f"[LOG] Проверка свойств: {rounds} случайных текстов — OK")
+
+
+def timed(fn, text: str, max_length: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text, max_length)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбиения текста на чанки")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-length", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-check", action="store_true", help="Не проверять свойства перед замером")
+    args = parser.parse_args()
+
+    words = load_words()
+    if not args.skip_check:
+        check_invariants(words)
+
+    candidates = [
+        ("chunking.split_text", split_text),
+        ("pars_pdf.split_text (старый)", legacy_split_text_newline),
+        ("load_book.split_text (старый)", legacy_split_text_space),
+    ]
+    rng = random.Random(42)
+    print(f"{'функция':<32} {'символов':>10} {'сек':>10} {'МБ/с':>10}")
+    for size in args.sizes:
+        text = make_text(words, size, rng)
+        for name, fn in candidates:
+            seconds = timed(fn, text, args.max_length, args.repeat)
+            throughput = len(text) / seconds / 1_000_000 if seconds else float("inf")
+            print(f"{name:<32} {len(text):>10} {seconds:>10.4f} {throughput:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Сравнение бэкендов эмбеддингов для семантического разбиения:
+PyTorch (SentenceTransformer) против ONNX int8 (onnxruntime).
+
+Для каждого бэкенда в отдельном процессе меряются скорость (предложений
+в секунду), время загрузки модели и пиковый RSS. Затем проверяется
+совпадение результата: косинус между векторами одного предложения и
+совпадение границ чанков split_text_semantic на страницах из chunks.txt.
+
+Запуск из корня проекта (ONNX-модель экспортируется при первом запуске):
+    python bench/bench_embeddings.py
+    python bench/bench_embeddings.py --threads 1 2 4 --batch-sizes 16 64
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from chunking import split_sentences
+
+CORPUS_PATH = os.path.join(ROOT, "chunks.txt")
+
+
+def load_pages(count: int) -> list:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [page.strip() for page in f.read().split("\n\n") if page.strip()][:count]
+
+
+def _measure(backend: str, threads: int, batch_size: int, pages: list, repeat: int, queue):
+    sys.path.insert(0, ROOT)
+    sys.stdout = open(os.devnull, "w")
+    import embeddings
+    from load_book import load_book
+
+    start = time.perf_counter()
+    if backend == "onnx":
+        encoder = embeddings.OnnxEncoder(batch_size=batch_size, threads=threads)
+    else:
+        import torch
+
+        if threads:
+            torch.set_num_threads(threads)
+        encoder = embeddings.TorchEncoder(batch_size=batch_size)
+    load_seconds = time.perf_counter() - start
+
+    sentences = [s for page in pages for s in split_sentences(page) if not load_book.is_noise_sentence(s)]
+    encoder.encode(sentences[:batch_size])  # прогрев
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = encoder.encode(sentences)
+        best = min(best, time.perf_counter() - start)
+
+    chunks = [load_book.split_text_semantic(page, encoder=encoder) for page in pages]
+    queue.put({
+        "load_s": load_seconds,
+        "sentences": len(sentences),
+        "sentences_per_s": len(sentences) / best,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "vectors": vectors,
+        "chunks": chunks,
+    })
+
+
+def measure(backend: str, threads: int, batch_size: int, pages: list, repeat: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(backend, threads, batch_size, pages, repeat, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def boundary_parity(reference: list, candidate: list) -> dict:
+    """Доля страниц с одинаковым разбиением и F1 по позициям границ."""
+    same_pages = 0
+    matched = expected = found = 0
+    for ref_chunks, cand_chunks in zip(reference, candidate):
+        same_pages += ref_chunks == cand_chunks
+        ref_bounds = set()
+        pos = 0
+        for chunk in ref_chunks[:-1]:
+            pos += len(chunk.split())
+            ref_bounds.add(pos)
+        cand_bounds = set()
+        pos = 0
+        for chunk in cand_chunks[:-1]:
+            pos += len(chunk.split())
+            cand_bounds.add(pos)
+        matched += len(ref_bounds & cand_bounds)
+        expected += len(ref_bounds)
+        found += len(cand_bounds)
+    precision = matched / found if found else 1.0
+    recall = matched / expected if expected else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"identical_pages": same_pages / max(len(reference), 1), "boundary_f1": f1}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк бэкендов эмбеддингов")
+    parser.add_argument("--pages", type=int, default=100, help="Сколько страниц из chunks.txt взять")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Потоки onnxruntime/torch, 0 — по числу ядер")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[64])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-f1", type=float, default=0.9, help="Минимально допустимое совпадение границ")
+    args = parser.parse_args()
+
+    import numpy as np
+
+    pages = load_pages(args.pages)
+    reference = measure("torch", args.threads[0], args.batch_sizes[0], pages, args.repeat)
+    print(
+        f"torch  потоки={args.threads[0]:<2} батч={args.batch_sizes[0]:<4} "
+        f"{reference['sentences_per_s']:>8.1f} предл/с  загрузка {reference['load_s']:.1f} с  "
+        f"RSS={reference['peak_rss_mb']:.0f} МБ"
+    )
+
+    worst_f1 = 1.0
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            result = measure("onnx", threads, batch_size, pages, args.repeat)
+            cosine = (reference["vectors"] * result["vectors"]).sum(axis=1)
+            parity = boundary_parity(reference["chunks"], result["chunks"])
+            worst_f1 = min(worst_f1, parity["boundary_f1"])
+            print(
+                f"onnx   потоки={threads:<2} батч={batch_size:<4} "
+                f"{result['sentences_per_s']:>8.1f} предл/с  загрузка {result['load_s']:.1f} с  "
+                f"RSS={result['peak_rss_mb']:.0f} МБ  "
+                f"косинус: ср {float(np.mean(cosine)):.4f} мин {float(np.min(cosine)):.4f}  "
+                f"страниц без изменений {parity['identical_pages']:.0%}  F1 границ {parity['boundary_f1']:.3f}"
+            )
+
+    if worst_f1 < args.min_f1:
+        print(f"[ERROR] Границы чанков ONNX расходятся с PyTorch: F1 {worst_f1:.3f} < {args.min_f1}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
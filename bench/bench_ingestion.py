@@ -0,0 +1,363 @@
+"""
+Микробенчмарки этапов загрузки книг: извлечение страниц из PDF,
+clean_text, разбиение на чанки (chunking и split_text_semantic),
+разбор имён файлов.
+
+Работает без сети: тексты берутся из chunks.txt, PDF генерируются
+в bench/fixtures/generated (и дополнительно берутся все PDF, положенные
+в bench/fixtures вручную). Семантическое разбиение требует модель
+SentenceTransformer и включается флагом --with-model.
+
+Быстрые этапы повторяются в цикле, чтобы каждый замер длился не меньше
+MIN_SAMPLE_SECONDS. Каждый этап выполняется в отдельном процессе, чтобы пиковый RSS
+относился только к нему. Результаты сохраняются в JSON; если указан
+--baseline, пропускная способность сравнивается с прошлым прогоном
+и при падении больше --threshold скрипт завершается с кодом 1.
+
+Запуск из корня проекта:
+    python bench/bench_ingestion.py --output bench/results/latest.json
+    python bench/bench_ingestion.py --baseline bench/results/latest.json --threshold 0.2
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, "bench", "fixtures")
+GENERATED_DIR = os.path.join(FIXTURES_DIR, "generated")
+CORPUS_PATH = os.path.join(ROOT, "chunks.txt")
+
+# Размеры сгенерированных книг, страниц
+PDF_SIZES = {"small": 10, "medium": 100, "large": 400}
+PAGE_CHARS = 2500
+
+TRANSLIT = dict(zip(
+    "абвгдеёжзийклмнопрстуфхцчшщъыьэюя",
+    ["a", "b", "v", "g", "d", "e", "e", "zh", "z", "i", "y", "k", "l", "m", "n", "o", "p", "r",
+     "s", "t", "u", "f", "kh", "ts", "ch", "sh", "shch", "", "y", "", "e", "yu", "ya"],
+))
+
+
+def load_corpus() -> str:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return f.read()
+
+
+def make_pages(corpus: str, count: int, seed: int = 0) -> list:
+    """Страницы в виде, похожем на вывод pypdf: короткие строки и переносы слов."""
+    rng = random.Random(seed)
+    words = corpus.split()
+    pages = []
+    for _ in range(count):
+        lines, line, size = [], [], 0
+        while size < PAGE_CHARS:
+            word = rng.choice(words)
+            line.append(word)
+            size += len(word) + 1
+            if sum(len(w) + 1 for w in line) > 70:
+                tail = line.pop()
+                cut = len(tail) // 2
+                lines.append(" ".join(line) + (f" {tail[:cut]}-" if cut > 2 else ""))
+                line = [tail[cut:]] if cut > 2 else [tail]
+        lines.append(" ".join(line))
+        pages.append("\n".join(lines))
+    return pages
+
+
+# --- Генерация PDF -----------------------------------------------------------
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _transliterate(text: str) -> str:
+    return "".join(TRANSLIT.get(ch.lower(), ch) if ord(ch) > 127 else ch for ch in text)
+
+
+def write_pdf(path: str, pages: list, title: str, author: str):
+    """Минимальный PDF со стандартным шрифтом Helvetica (только латиница)."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages заполняется после страниц
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Title ({_pdf_escape(title)}) /Author ({_pdf_escape(author)}) /Producer (bench) >>".encode("latin-1"),
+    ]
+    kids = []
+    for page in pages:
+        lines = _transliterate(page).encode("latin-1", "replace").decode("latin-1").split("\n")
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td\n" + "".join(f"({_pdf_escape(line)}) Tj T*\n" for line in lines) + "ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode("latin-1")
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def fixture_pdfs(corpus: str) -> dict:
+    os.makedirs(GENERATED_DIR, exist_ok=True)
+    pdfs = {}
+    for name, count in PDF_SIZES.items():
+        path = os.path.join(GENERATED_DIR, f"{name}.pdf")
+        if not os.path.exists(path):
+            write_pdf(path, make_pages(corpus, count, seed=count), f"Bench {name}", "Bench Author")
+        pdfs[name] = path
+    for filename in sorted(os.listdir(FIXTURES_DIR)):
+        if filename.lower().endswith(".pdf"):
+            pdfs[os.path.splitext(filename)[0]] = os.path.join(FIXTURES_DIR, filename)
+    return pdfs
+
+
+# --- Этапы -------------------------------------------------------------------
+
+# Один замер длится не меньше этого времени: быстрые случаи (clean_text/10
+# выполняется за доли миллисекунды) повторяются в цикле, иначе шум таймера
+# сравним с порогом регрессии
+MIN_SAMPLE_SECONDS = 0.05
+
+
+def _timed(fn, loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        fn()
+    return time.perf_counter() - start
+
+
+def best_of(fn, repeat: int) -> float:
+    """Лучшее из repeat время одного вызова fn; каждый замер не короче MIN_SAMPLE_SECONDS."""
+    loops = 1
+    elapsed = _timed(fn, loops)
+    while elapsed < MIN_SAMPLE_SECONDS:
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(MIN_SAMPLE_SECONDS / elapsed) + 1))
+        elapsed = _timed(fn, loops)
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, _timed(fn, loops))
+    return best / loops
+
+
+def stage_extract(pdf_path: str, repeat: int) -> dict:
+    from load_book import load_book
+
+    result = {}
+
+    def run():
+        result["pages"], _ = load_book.extract_pages_and_metadata(pdf_path)
+
+    seconds = best_of(run, repeat)
+    pages = result["pages"]
+    chars = sum(len(page["text"]) for page in pages)
+    return {"seconds": seconds, "pages_per_s": len(pages) / seconds, "chars_per_s": chars / seconds}
+
+
+def stage_clean_text(pages: list, repeat: int) -> dict:
+    from load_book import load_book
+
+    seconds = best_of(lambda: [load_book.clean_text(page) for page in pages], repeat)
+    chars = sum(map(len, pages))
+    return {"seconds": seconds, "pages_per_s": len(pages) / seconds, "chars_per_s": chars / seconds}
+
+
+def stage_split_text(pages: list, repeat: int) -> dict:
+    import chunking
+    from load_book import load_book
+
+    cleaned = [load_book.clean_text(page) for page in pages]
+    result = {}
+
+    def run():
+        result["chunks"] = sum(len(chunking.split_text(text, max_length=1000)) for text in cleaned)
+
+    seconds = best_of(run, repeat)
+    chars = sum(map(len, cleaned))
+    return {"seconds": seconds, "chunks_per_s": result["chunks"] / seconds, "chars_per_s": chars / seconds}
+
+
+def stage_chunk_pages(pages: list, repeat: int) -> dict:
+    import chunking
+    from load_book import load_book
+
+    cleaned = [(i + 1, load_book.clean_text(page)) for i, page in enumerate(pages)]
+    result = {}
+
+    def run():
+        result["chunks"] = sum(1 for _ in chunking.chunk_pages(cleaned, max_length=1000))
+
+    seconds = best_of(run, repeat)
+    chars = sum(len(text) for _, text in cleaned)
+    return {"seconds": seconds, "chunks_per_s": result["chunks"] / seconds, "chars_per_s": chars / seconds}
+
+
+def stage_semantic(pages: list, repeat: int) -> dict:
+    from embeddings import get_encoder
+    from load_book import load_book
+
+    cleaned = [load_book.clean_text(page) for page in pages]
+    get_encoder()  # загрузка модели не входит в замер
+    result = {}
+
+    def run():
+        result["chunks"] = sum(len(load_book.split_text_semantic(text)) for text in cleaned)
+
+    seconds = best_of(run, repeat)
+    chars = sum(map(len, cleaned))
+    return {
+        "seconds": seconds,
+        "pages_per_s": len(cleaned) / seconds,
+        "chunks_per_s": result["chunks"] / seconds,
+        "chars_per_s": chars / seconds,
+    }
+
+
+def stage_filenames(count: int, repeat: int) -> dict:
+    from load_book import load_book
+
+    rng = random.Random(0)
+    names = []
+    for i in range(count):
+        name = f"Архитектура ЭВМ том {i} ... Иванов И.И..pdf"
+        names.append(f"{uuid.UUID(int=rng.getrandbits(128))}-{name}" if i % 2 else name)
+
+    seconds = best_of(lambda: [load_book.parse_filename_for_title_author(name) for name in names], repeat)
+    return {"seconds": seconds, "calls_per_s": count / seconds}
+
+
+def _run_stage(stage: str, kwargs: dict, queue):
+    sys.path.insert(0, ROOT)
+    # Скрипты ingestion печатают подробный лог — в замерах он не нужен
+    sys.stdout = open(os.devnull, "w")
+    metrics = STAGES[stage](**kwargs)
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(metrics)
+
+
+STAGES = {
+    "extract": stage_extract,
+    "clean_text": stage_clean_text,
+    "split_text": stage_split_text,
+    "chunk_pages": stage_chunk_pages,
+    "semantic": stage_semantic,
+    "filenames": stage_filenames,
+}
+
+# Главная метрика этапа — по ней сравнивается с базовым прогоном
+PRIMARY_METRIC = {
+    "extract": "pages_per_s",
+    "clean_text": "chars_per_s",
+    "split_text": "chars_per_s",
+    "chunk_pages": "chars_per_s",
+    "semantic": "pages_per_s",
+    "filenames": "calls_per_s",
+}
+
+
+def run_isolated(stage: str, **kwargs) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, kwargs, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Этап {stage} завершился с кодом {process.exitcode}")
+    return queue.get()
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, metrics in results["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous:
+            continue
+        key = PRIMARY_METRIC[metrics["stage"]]
+        if previous.get(key) and metrics[key] < previous[key] * (1 - threshold):
+            drop = 1 - metrics[key] / previous[key]
+            regressions.append(f"{name}: {key} {previous[key]:.1f} → {metrics[key]:.1f} (-{drop:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки этапов загрузки книг")
+    parser.add_argument("--stages", nargs="+", default=[s for s in STAGES if s != "semantic"], choices=list(STAGES))
+    parser.add_argument("--with-model", action="store_true", help="Добавить семантическое разбиение")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000], help="Размеры наборов страниц")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое падение пропускной способности")
+    args = parser.parse_args()
+
+    stages = list(args.stages)
+    if args.with_model and "semantic" not in stages:
+        stages.append("semantic")
+
+    corpus = load_corpus()
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": {},
+    }
+
+    cases = []
+    for stage in stages:
+        if stage == "extract":
+            for name, path in fixture_pdfs(corpus).items():
+                cases.append((f"extract/{name}", stage, {"pdf_path": path}))
+        elif stage == "filenames":
+            cases.append(("filenames/10000", stage, {"count": 10000}))
+        else:
+            for count in args.pages:
+                # Семантическое разбиение слишком медленное для больших наборов
+                if stage == "semantic" and count > 100:
+                    continue
+                cases.append((f"{stage}/{count}", stage, {"pages": make_pages(corpus, count)}))
+
+    for name, stage, kwargs in cases:
+        metrics = run_isolated(stage, repeat=args.repeat, **kwargs)
+        metrics["stage"] = stage
+        results["cases"][name] = metrics
+        rates = " ".join(f"{k}={v:,.0f}" for k, v in metrics.items() if k.endswith("_per_s"))
+        print(f"{name:<22} {metrics['seconds']:>8.4f} с  {rates}  RSS={metrics['peak_rss_mb']:.0f} МБ")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[LOG] Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("[ERROR] Регрессия производительности:")
+            for line in regressions:
+                print("  " + line)
+            sys.exit(1)
+        print(f"[LOG] Регрессий больше {args.threshold:.0%} нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Нагрузочный тест чата: N клиентов Socket.IO одновременно отправляют
+`chat message` в main.socket_app.
+
+Ollama и Weaviate заменяются локальными заглушками, поэтому тест
+воспроизводим на любой машине:
+  * fake-ollama — потоковый /api/chat с заданной скоростью токенов;
+  * поиск в socket_manager подменяется функцией, которая блокирует поток
+    на --search-delay секунд (как синхронный клиент Weaviate) и
+    возвращает --hits отрывков.
+
+Сервер и заглушки Ollama запускаются отдельными процессами, чтобы клиенты
+не искажали задержку event loop сервера. Заглушек может быть несколько
+(--ollama-backends): сервер получает их в OLLAMA_URLS и распределяет
+генерацию через пул (ollama_pool.py); --kill-backend-after останавливает
+одну заглушку посреди теста для проверки переключения. Итог: p50/p95/p99
+времени до первого частичного ответа и до полного ответа, число событий
+в секунду, задержка event loop сервера и статистика по бэкендам Ollama.
+
+Запуск из корня проекта:
+    python bench/bench_load.py --clients 50 --token-rate 30 --tokens 200
+    python bench/bench_load.py --clients 100 --same-question   # проверка объединения запросов
+    python bench/bench_load.py --clients 40 --ollama-backends 4 --max-concurrency 2
+    python bench/bench_load.py --clients 40 --ollama-backends 2 --kill-backend-after 1
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import socketio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summary(values: list) -> dict:
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "count": len(values),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# --- Заглушка Ollama ---------------------------------------------------------
+
+def serve_fake_ollama(port: int, token_rate: float, tokens: int):
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+
+    @app.post("/api/chat")
+    async def chat(payload: dict):
+        async def stream():
+            for i in range(tokens):
+                await asyncio.sleep(1 / token_rate)
+                yield json.dumps({"message": {"content": f"токен{i} "}, "done": False}, ensure_ascii=False) + "\n"
+            yield json.dumps({"message": {"content": ""}, "done": True}) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": []}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error")
+
+
+# --- Сервер чата с подменённым поиском ---------------------------------------
+
+def serve_chat(port: int, search_delay: float, hits: int):
+    sys.path.insert(0, ROOT)
+    import uvicorn
+    import main
+    import socket_manager
+    from wv.wv_queries import SearchHit
+
+    def fake_search(query_text: str, *args, **kwargs):
+        time.sleep(search_delay)
+        return [
+            SearchHit(f"Отрывок {i} по запросу «{query_text}». " * 20, "Тестовая книга", "Автор", i + 1, 1.0)
+            for i in range(hits)
+        ]
+
+    socket_manager.search_hybrid = fake_search
+    socket_manager.search_by_similarity = fake_search
+    socket_manager.search_by_keyword = fake_search
+
+    lags = []
+
+    async def monitor_loop_lag(interval: float = 0.05):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append((time.perf_counter() - start - interval) * 1000)
+
+    # Монитор запускается вместе с lifespan сервера (main.lifespan)
+    server_lifespan = main.app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        monitor = asyncio.create_task(monitor_loop_lag())
+        async with server_lifespan(app):
+            yield
+        monitor.cancel()
+
+    main.app.router.lifespan_context = lifespan
+
+    @main.app.get("/__loadtest/stats")
+    def stats(reset: bool = False):
+        result = summary(lags)
+        result["max"] = max(lags) if lags else None
+        if reset:
+            lags.clear()
+        return result
+
+    uvicorn.run(main.socket_app, host="127.0.0.1", port=port, log_level="error")
+
+
+# --- Клиенты -----------------------------------------------------------------
+
+class ClientResult:
+    __slots__ = ("first_partial", "full_answer", "events", "error")
+
+    def __init__(self):
+        self.first_partial = None
+        self.full_answer = None
+        self.events = 0
+        self.error = None
+
+
+def run_client(url: str, question: str, search_type: str, timeout: float, result: ClientResult, start_barrier):
+    client = socketio.Client(reconnection=False)
+    done = threading.Event()
+    sent_at = [0.0]
+
+    @client.on("partial answer")
+    def on_partial(data):
+        result.events += 1
+        if result.first_partial is None:
+            result.first_partial = time.perf_counter() - sent_at[0]
+
+    @client.on("loading answer")
+    def on_loading(data):
+        result.events += 1
+
+    @client.on("chat message")
+    def on_message(data):
+        result.events += 1
+        result.full_answer = time.perf_counter() - sent_at[0]
+        done.set()
+
+    try:
+        client.connect(url, transports=["websocket"], wait_timeout=timeout)
+        start_barrier.wait()
+        sent_at[0] = time.perf_counter()
+        client.emit("chat message", {"text": question, "searchType": search_type})
+        if not done.wait(timeout):
+            result.error = "timeout"
+    except Exception as e:
+        result.error = str(e)
+        # Без этого клиента остальные навсегда зависнут на барьере
+        start_barrier.abort()
+    finally:
+        client.disconnect()
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"[ERROR] Сервис {url} не поднялся за {timeout} с")
+
+
+def run_load(args) -> dict:
+    ollama_ports = [free_port() for _ in range(args.ollama_backends)]
+    chat_port = free_port()
+    env = dict(
+        os.environ,
+        OLLAMA_URLS=",".join(f"http://127.0.0.1:{port}" for port in ollama_ports),
+        OLLAMA_MAX_CONCURRENCY=str(args.max_concurrency),
+        OLLAMA_HEALTH_INTERVAL="1",
+    )
+    script = os.path.abspath(__file__)
+    backends = [
+        subprocess.Popen(
+            [sys.executable, script, "fake-ollama", "--port", str(port),
+             "--token-rate", str(args.token_rate), "--tokens", str(args.tokens)],
+            cwd=ROOT,
+        )
+        for port in ollama_ports
+    ]
+    processes = backends + [
+        subprocess.Popen(
+            [sys.executable, script, "server", "--port", str(chat_port),
+             "--search-delay", str(args.search_delay), "--hits", str(args.hits)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+        ),
+    ]
+    chat_url = f"http://127.0.0.1:{chat_port}"
+    try:
+        for port in ollama_ports:
+            wait_for(f"http://127.0.0.1:{port}/api/tags")
+        wait_for(f"{chat_url}/")
+        httpx.get(f"{chat_url}/__loadtest/stats", params={"reset": True})
+
+        print(f"[LOG] Клиентов: {args.clients}, токенов/с: {args.token_rate}, токенов в ответе: {args.tokens}")
+        results = [ClientResult() for _ in range(args.clients)]
+        barrier = threading.Barrier(args.clients)
+        threads = []
+        for i, result in enumerate(results):
+            question = "Что такое система прерываний?" if args.same_question else f"Вопрос номер {i}"
+            thread = threading.Thread(
+                target=run_client,
+                args=(chat_url, question, args.search_type, args.timeout, result, barrier),
+                daemon=True,
+            )
+            threads.append(thread)
+            thread.start()
+
+        started = time.perf_counter()
+        if args.kill_backend_after is not None:
+            # Первая заглушка падает посреди теста; её запросы должны уйти на остальные
+            killer = threading.Timer(args.kill_backend_after, backends[0].kill)
+            killer.daemon = True
+            killer.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        loop_lag = httpx.get(f"{chat_url}/__loadtest/stats").json()
+        server_metrics = httpx.get(f"{chat_url}/api/metrics").json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    events = sum(result.events for result in results)
+    report = {
+        "clients": args.clients,
+        "errors": sum(1 for result in results if result.error),
+        "first_partial_s": summary([r.first_partial for r in results if r.first_partial is not None]),
+        "full_answer_s": summary([r.full_answer for r in results if r.full_answer is not None]),
+        "emits_per_s": events / elapsed if elapsed else None,
+        "loop_lag_ms": loop_lag,
+        "degradations": server_metrics["degradations"],
+        "ollama_backends": server_metrics["ollama"]["backends"],
+    }
+    return report
+
+
+def print_report(report: dict):
+    def fmt(stats: dict, scale: float = 1.0, unit: str = "с"):
+        if not stats or stats.get("p50") is None:
+            return "нет данных"
+        return " ".join(
+            f"{name}={stats[name] * scale:.3f}{unit}" for name in ("p50", "p95", "p99")
+        )
+
+    print(f"Клиентов: {report['clients']}, ошибок: {report['errors']}")
+    print(f"До первого частичного ответа: {fmt(report['first_partial_s'])}")
+    print(f"До полного ответа:            {fmt(report['full_answer_s'])}")
+    print(f"Событий в секунду:            {report['emits_per_s']:.1f}")
+    print(f"Задержка event loop сервера:  {fmt(report['loop_lag_ms'], unit='мс')}")
+    if report["degradations"]:
+        print(f"Деградации: {report['degradations']}")
+    for backend in report["ollama_backends"]:
+        print(
+            f"  {backend['url']}: запросов {backend['requests']}, ошибок {backend['failures']}, "
+            f"{backend['tokens_per_s']:.1f} токенов/с, {'здоров' if backend['healthy'] else 'недоступен'}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Socket.IO чата")
+    sub = parser.add_subparsers(dest="command")
+
+    fake = sub.add_parser("fake-ollama", help="Только заглушка Ollama")
+    fake.add_argument("--port", type=int, default=11435)
+    fake.add_argument("--token-rate", type=float, default=30.0)
+    fake.add_argument("--tokens", type=int, default=200)
+
+    server = sub.add_parser("server", help="Только сервер чата с подменённым поиском")
+    server.add_argument("--port", type=int, default=5042)
+    server.add_argument("--search-delay", type=float, default=0.05)
+    server.add_argument("--hits", type=int, default=6)
+
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--token-rate", type=float, default=30.0, help="Токенов в секунду на один ответ")
+    parser.add_argument("--tokens", type=int, default=200, help="Токенов в одном ответе")
+    parser.add_argument("--search-delay", type=float, default=0.05, help="Время блокирующего поиска, с")
+    parser.add_argument("--hits", type=int, default=6, help="Отрывков в результате поиска")
+    parser.add_argument("--search-type", default="1")
+    parser.add_argument("--same-question", action="store_true", help="Все клиенты задают один вопрос")
+    parser.add_argument("--ollama-backends", type=int, default=1, help="Сколько заглушек Ollama запустить")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="Одновременных запросов на один бэкенд")
+    parser.add_argument("--kill-backend-after", type=float, help="Остановить первую заглушку через N секунд")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if args.command == "fake-ollama":
+        serve_fake_ollama(args.port, args.token_rate, args.tokens)
+    elif args.command == "server":
+        serve_chat(args.port, args.search_delay, args.hits)
+    else:
+        report = run_load(args)
+        print_report(report)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"[LOG] Отчёт сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
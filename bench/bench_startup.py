@@ -0,0 +1,135 @@
+"""
+Профиль времени импорта: сколько стоит запуск сервера и скрипта загрузки
+книг до начала полезной работы.
+
+Каждая цель импортируется в чистом процессе с `python -X importtime`
+(несколько повторов, берётся лучший). Проверяется, что тяжёлые зависимости
+(weaviate, torch, sentence-transformers, pypdf ...) не загружаются
+при импорте — они должны подгружаться при первом использовании или
+в фоновом прогреве. Скрипт завершается с кодом 1, если тяжёлый модуль
+импортирован, время превышает --max-ms или, при указанном --baseline,
+выросло больше чем на --threshold.
+
+Запуск из корня проекта:
+    python bench/bench_startup.py
+    python bench/bench_startup.py --output bench/results/startup.json
+    python bench/bench_startup.py --baseline bench/results/startup.json --threshold 0.3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ["weaviate", "torch", "sentence_transformers", "transformers", "onnxruntime", "pypdf"]
+
+# Что импортируется и какие пакеты при этом загружаться не должны
+TARGETS = {
+    "server": {
+        "module": "main",
+        "path": ROOT,
+        "forbidden": HEAVY + ["numpy"],
+    },
+    "load_book": {
+        "module": "load_book",
+        "path": os.path.join(ROOT, "load_book"),
+        "forbidden": HEAVY,
+    },
+}
+
+
+def profile(module: str, path: str) -> list:
+    """Строки -X importtime: (модуль, глубина вложенности, собственное и полное время в мс)."""
+    code = f"import sys; sys.path.insert(0, {path!r}); import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"[ERROR] Не удалось импортировать {module}:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+
+def measure(target: dict, repeat: int, top: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        rows = profile(target["module"], target["path"])
+        total = next(cumulative for name, depth, _, cumulative in rows if name == target["module"] and depth == 0)
+        if best is None or total < best[0]:
+            best = (total, rows)
+
+    total, rows = best
+    loaded = {name.split(".")[0] for name, _, _, _ in rows}
+    # importtime печатает вложенные импорты перед родителем: поддерево цели —
+    # строки с ненулевой глубиной прямо над ней
+    end = next(i for i, (name, depth, _, _) in enumerate(rows) if name == target["module"] and depth == 0)
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    # Самые дорогие пакеты, импортированные целью напрямую
+    direct = [(name, cumulative) for name, depth, _, cumulative in rows[start:end] if depth == 1]
+    return {
+        "total_ms": total,
+        "modules": len(rows),
+        "forbidden_loaded": sorted(loaded & set(target["forbidden"])),
+        "heaviest": sorted(direct, key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль времени импорта")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Сколько самых дорогих импортов показать")
+    parser.add_argument("--max-ms", type=float, help="Предельное время импорта любой цели, мс")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Допустимый рост времени импорта")
+    args = parser.parse_args()
+
+    results = {}
+    problems = []
+    for name in args.targets:
+        result = measure(TARGETS[name], args.repeat, args.top)
+        results[name] = result
+        print(f"{name}: {result['total_ms']:.0f} мс, модулей {result['modules']}")
+        for module, cumulative in result["heaviest"]:
+            print(f"    {module:<32} {cumulative:>8.1f} мс")
+        if result["forbidden_loaded"]:
+            problems.append(f"{name}: при импорте загружаются {', '.join(result['forbidden_loaded'])}")
+        if args.max_ms is not None and result["total_ms"] > args.max_ms:
+            problems.append(f"{name}: {result['total_ms']:.0f} мс > {args.max_ms:.0f} мс")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[LOG] Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for name, result in results.items():
+            previous = baseline.get(name, {}).get("total_ms")
+            if previous and result["total_ms"] > previous * (1 + args.threshold):
+                problems.append(f"{name}: {previous:.0f} мс → {result['total_ms']:.0f} мс")
+
+    if problems:
+        for problem in problems:
+            print(f"[ERROR] {problem}")
+        sys.exit(1)
+    print("[LOG] Регрессий времени запуска нет")
+
+
+if __name__ == "__main__":
+    main()
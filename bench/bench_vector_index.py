@@ -0,0 +1,211 @@
+"""
+Бенчмарк векторного индекса: recall@k против точного перебора, задержки
+p50/p99 и объём памяти для разных настроек HNSW и сжатия.
+
+Векторы берутся из рабочей коллекции Document, для каждой конфигурации
+создаётся временная коллекция с теми же векторами (Ollama не нужен).
+Запросы — случайные векторы корпуса с небольшим шумом, эталон — точный
+косинусный перебор. Требует numpy и запущенный Weaviate.
+
+Запуск из корня проекта:
+    python bench/bench_vector_index.py --ef 16 32 64 128 --compression none pq bq
+    python bench/bench_vector_index.py --metrics-url http://localhost:2112/metrics
+
+Память по Prometheus доступна, если в docker-compose включено
+PROMETHEUS_MONITORING_ENABLED=true; иначе печатается оценка по формуле.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import numpy as np
+import weaviate
+from weaviate.classes.config import Configure
+from weaviate.util import generate_uuid5
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wv import wv_schema
+
+BENCH_COLLECTION = "DocumentIndexBench"
+
+
+def load_vectors(client, source: str, limit: int) -> np.ndarray:
+    print(f"[LOG] Чтение векторов из коллекции {source}...")
+    collection = client.collections.get(source)
+    vectors = []
+    for item in collection.iterator(include_vector=True):
+        vector = item.vector.get(wv_schema.VECTOR_NAME)
+        if vector:
+            vectors.append(vector)
+        if len(vectors) >= limit:
+            break
+    if not vectors:
+        raise SystemExit(f"[ERROR] В коллекции {source} нет векторов '{wv_schema.VECTOR_NAME}'")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    print(f"[LOG] Загружено векторов: {matrix.shape[0]}, размерность {matrix.shape[1]}")
+    return matrix
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = picked + rng.normal(scale=noise, size=picked.shape).astype(np.float32)
+    return queries
+
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int) -> list:
+    # Weaviate по умолчанию использует косинусное расстояние
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    normed_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = normed_queries @ normed.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def build_collection(client, vectors: np.ndarray, ef_construction: int, max_connections: int):
+    if client.collections.exists(BENCH_COLLECTION):
+        client.collections.delete(BENCH_COLLECTION)
+    client.collections.create(
+        BENCH_COLLECTION,
+        properties=wv_schema.properties(),
+        vectorizer_config=[
+            Configure.NamedVectors.none(
+                name=wv_schema.VECTOR_NAME,
+                vector_index_config=wv_schema.vector_index_config(
+                    ef_construction=ef_construction,
+                    max_connections=max_connections,
+                    compression="none",
+                ),
+            )
+        ],
+    )
+    collection = client.collections.get(BENCH_COLLECTION)
+    start = time.perf_counter()
+    with collection.batch.fixed_size(batch_size=200) as batch:
+        for i, vector in enumerate(vectors):
+            batch.add_object(
+                properties={"page_number": i},
+                vector={wv_schema.VECTOR_NAME: vector.tolist()},
+                uuid=generate_uuid5(i),
+            )
+    if collection.batch.failed_objects:
+        print(f"[WARNING] Не вставлено объектов: {len(collection.batch.failed_objects)}")
+    print(f"[LOG] Индекс построен за {time.perf_counter() - start:.1f} с")
+    return collection
+
+
+def run_queries(collection, queries: np.ndarray, truth: list, k: int, index_of: dict):
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        response = collection.query.near_vector(
+            near_vector=query.tolist(),
+            limit=k,
+            target_vector=wv_schema.VECTOR_NAME,
+            return_properties=[],
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {index_of[str(o.uuid)] for o in response.objects if str(o.uuid) in index_of}
+        recalls.append(len(found & expected) / k)
+    latencies.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def estimate_memory_mb(count: int, dims: int, max_connections: int, compression: str) -> float:
+    """Оценка памяти индекса: векторы в кэше плюс связи графа HNSW."""
+    if compression == "pq":
+        vector_bytes = wv_schema.PQ_SEGMENTS or dims  # байт на сегмент
+    elif compression == "bq":
+        vector_bytes = dims / 8
+    else:
+        vector_bytes = dims * 4
+    graph_bytes = max_connections * 2 * 8
+    return count * (vector_bytes + graph_bytes) / 1024 / 1024
+
+
+def scrape_heap_mb(metrics_url: str):
+    try:
+        response = httpx.get(metrics_url, timeout=5.0)
+        for line in response.text.splitlines():
+            if line.startswith("go_memstats_heap_inuse_bytes "):
+                return float(line.split()[1]) / 1024 / 1024
+    except Exception as e:
+        print(f"[WARNING] Не удалось получить метрики {metrics_url}: {e}")
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк настроек векторного индекса Weaviate")
+    parser.add_argument("--source", default=wv_schema.CLASS_NAME)
+    parser.add_argument("--limit", type=int, default=20000, help="Сколько векторов взять из корпуса")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.01)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[wv_schema.HNSW_EF_CONSTRUCTION])
+    parser.add_argument("--max-connections", type=int, nargs="+", default=[wv_schema.HNSW_MAX_CONNECTIONS])
+    parser.add_argument("--compression", nargs="+", default=["none"], choices=wv_schema.COMPRESSION_TYPES)
+    parser.add_argument("--metrics-url", help="Prometheus-метрики Weaviate для замера памяти")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временную коллекцию")
+    args = parser.parse_args()
+
+    client = weaviate.connect_to_local(skip_init_checks=True)
+    results = []
+    try:
+        vectors = load_vectors(client, args.source, args.limit)
+        queries = make_queries(vectors, args.queries, args.noise, seed=0)
+        k = min(args.k, len(vectors) - 1)
+        truth = brute_force(vectors, queries, k)
+        index_of = {str(generate_uuid5(i)): i for i in range(len(vectors))}
+
+        for max_connections in args.max_connections:
+            for ef_construction in args.ef_construction:
+                for compression in args.compression:
+                    print(f"[LOG] maxConnections={max_connections} efConstruction={ef_construction} сжатие={compression}")
+                    collection = build_collection(client, vectors, ef_construction, max_connections)
+                    if compression != "none":
+                        wv_schema.update_vector_index(client, BENCH_COLLECTION, compression=compression)
+                    heap_mb = scrape_heap_mb(args.metrics_url) if args.metrics_url else None
+                    for ef in args.ef:
+                        wv_schema.update_vector_index(client, BENCH_COLLECTION, ef=ef)
+                        run_queries(collection, queries[:10], truth[:10], k, index_of)  # прогрев
+                        row = {
+                            "max_connections": max_connections,
+                            "ef_construction": ef_construction,
+                            "compression": compression,
+                            "ef": ef,
+                            **run_queries(collection, queries, truth, k, index_of),
+                            "memory_estimate_mb": estimate_memory_mb(
+                                len(vectors), vectors.shape[1], max_connections, compression
+                            ),
+                            "heap_inuse_mb": heap_mb,
+                        }
+                        results.append(row)
+                        print(
+                            f"  ef={ef:<4} recall@{k}={row['recall']:.3f} p50={row['p50_ms']:.2f} мс "
+                            f"p99={row['p99_ms']:.2f} мс память≈{row['memory_estimate_mb']:.1f} МБ"
+                            + (f" heap={heap_mb:.1f} МБ" if heap_mb is not None else "")
+                        )
+    finally:
+        if not args.keep and client.collections.exists(BENCH_COLLECTION):
+            client.collections.delete(BENCH_COLLECTION)
+        client.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[LOG] Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import re
+from bisect import bisect_right
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Единый движок разбиения текста на чанки.
+#
+# Разбиение идёт курсором слева направо: для каждого чанка берётся окно
+# размером с бюджет, граница ищется внутри окна (конец предложения, иначе
+# пробел, иначе жёсткий разрез), после чего курсор сдвигается на границу.
+# Оставшийся текст никогда не копируется и не обрезается заново, поэтому
+# время работы линейно от длины текста.
+
+WORD_RE = re.compile(r"\S+")
+SPACE_RE = re.compile(r"\s+")
+NON_SPACE_RE = re.compile(r"\S")
+SENTENCE_END_RE = re.compile(r"[.!?…]+[»\"')\]]*$")
+# Жадный префикс находит последний конец предложения в окне за один вызов
+LAST_SENTENCE_END_RE = re.compile(r".*[.!?…][»\"')\]]*(?=\s)", re.S)
+SENTENCE_GAP_RE = re.compile(r"[.!?…][»\"')\]]*\s+")
+WHITESPACE = (" ", "\n", "\t", "\r")
+
+DEFAULT_MAX_LENGTH = 1000
+
+
+def char_length(word: str) -> int:
+    return len(word)
+
+
+def token_length(word: str) -> int:
+    # Грубая оценка: одно слово — один токен
+    return 1
+
+
+class Chunk(NamedTuple):
+    text: str
+    page_start: Optional[int]
+    page_end: Optional[int]
+
+
+class Chunker:
+    """
+    Потоковый разбиватель текста на чанки.
+
+    Страницы подаются через feed(), готовые чанки возвращаются сразу,
+    незавершённый хвост переносится на следующую страницу (чанк может
+    пересекать границу страниц). В конце нужно вызвать flush().
+
+    max_length и overlap задаются в символах. Для бюджета в токенах
+    передайте length_fn=token_length или функцию токенизатора модели —
+    тогда max_length и overlap считаются в её единицах. Слово длиннее
+    бюджета режется в обоих режимах.
+    """
+
+    def __init__(
+        self,
+        max_length: int = DEFAULT_MAX_LENGTH,
+        overlap: int = 0,
+        sentence_aware: bool = True,
+        length_fn: Callable[[str], int] = char_length,
+    ):
+        if max_length <= 0:
+            raise ValueError("max_length должен быть положительным")
+        if overlap < 0 or overlap >= max_length:
+            raise ValueError("overlap должен быть в диапазоне [0, max_length)")
+        self.max_length = max_length
+        self.overlap = overlap
+        self.sentence_aware = sentence_aware
+        self.length_fn = length_fn
+        self._by_chars = length_fn is char_length
+
+        # Незавершённый хвост, начала страниц внутри него и граница перекрытия
+        self._tail = ""
+        self._offsets: List[int] = []
+        self._pages: List[Optional[int]] = []
+        self._carried = 0
+
+    def _page_at(self, pos: int) -> Optional[int]:
+        return self._pages[bisect_right(self._offsets, pos) - 1]
+
+    def _window(self, buffer: str, cursor: int) -> Tuple[int, bool, list]:
+        """
+        Конец окна, в которое укладывается бюджет, и признак того,
+        что в окно поместился весь оставшийся текст.
+        """
+        if self._by_chars:
+            window_end = cursor + self.max_length
+            return min(window_end, len(buffer)), window_end >= len(buffer), []
+
+        words = []
+        total = 0
+        for match in WORD_RE.finditer(buffer, cursor):
+            length = self.length_fn(match.group())
+            if words and total + length > self.max_length:
+                return words[-1][1], False, words
+            if length > self.max_length:
+                # Слово длиннее бюджета режем, как и в режиме символов
+                end = match.start() + self._longest_prefix(match.group())
+                return end, False, [(match.start(), end, self.length_fn(buffer[match.start():end]))]
+            words.append((match.start(), match.end(), length))
+            total += length
+        return len(buffer), True, words
+
+    def _longest_prefix(self, word: str) -> int:
+        """Длина самого длинного префикса слова, укладывающегося в бюджет (не меньше 1)."""
+        low, high = 1, len(word) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.length_fn(word[:middle]) <= self.max_length:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _boundary(self, buffer: str, cursor: int, window_end: int) -> int:
+        """Позиция разреза внутри окна [cursor, window_end]."""
+        if window_end >= len(buffer) or buffer[window_end].isspace():
+            candidate = window_end
+        else:
+            space = max(buffer.rfind(ch, cursor, window_end) for ch in WHITESPACE)
+            # Без пробелов в окне режем жёстко по бюджету
+            candidate = space if space > cursor else window_end
+
+        if self.sentence_aware:
+            # Конец предложения внутри перекрытия не годится: следующий чанк
+            # повторял бы только хвост предыдущего
+            match = LAST_SENTENCE_END_RE.match(buffer, max(cursor, self._carried), candidate + 1)
+            if match and match.end() <= candidate:
+                return match.end()
+        return candidate
+
+    def _overlap_start(self, buffer: str, cursor: int, cut: int, words: list) -> int:
+        """Начало следующего чанка с учётом перекрытия."""
+        if not self.overlap:
+            return cut
+
+        if self._by_chars:
+            start = cut - self.overlap
+            if start > cursor and not buffer[start - 1].isspace():
+                # Перекрытие начинаем с целого слова
+                space = SPACE_RE.search(buffer, start, cut)
+                start = space.end() if space else cut
+        else:
+            start = cut
+            budget = self.overlap
+            for word_start, word_end, length in reversed(words):
+                if word_end > cut:
+                    continue
+                if length > budget:
+                    break
+                budget -= length
+                start = word_start
+
+        if start <= cursor:
+            # Перекрытие не должно съедать весь чанк, иначе не будет прогресса
+            return cut
+        if self.sentence_aware:
+            # В режиме предложений перекрытие состоит только из целых предложений
+            gap = SENTENCE_GAP_RE.search(buffer, max(cursor, start - 3), cut)
+            while gap and gap.end() < start:
+                gap = SENTENCE_GAP_RE.search(buffer, gap.end(), cut)
+            return gap.end() if gap and gap.end() < cut else cut
+        return start
+
+    def _drain(self, buffer: str, final: bool) -> Iterator[Chunk]:
+        match = NON_SPACE_RE.search(buffer)
+        cursor = match.start() if match else len(buffer)
+        while cursor < len(buffer):
+            window_end, fits, words = self._window(buffer, cursor)
+            if fits and not final:
+                # Хвост может продолжиться на следующей странице
+                break
+            cut = len(buffer) if fits else self._boundary(buffer, cursor, window_end)
+            text = buffer[cursor:cut].rstrip()
+            if text:
+                yield Chunk(text, self._page_at(cursor), self._page_at(cursor + len(text) - 1))
+            if fits:
+                cursor = len(buffer)
+                break
+
+            start = self._overlap_start(buffer, cursor, cut, words)
+            self._carried = cut if start < cut else 0
+            match = NON_SPACE_RE.search(buffer, start)
+            cursor = match.start() if match else len(buffer)
+
+        self._tail = buffer[cursor:]
+        first = max(bisect_right(self._offsets, cursor) - 1, 0)
+        self._offsets = [max(offset - cursor, 0) for offset in self._offsets[first:]]
+        self._pages = self._pages[first:]
+        self._carried = max(self._carried - cursor, 0)
+
+    def feed(self, text: str, page: Optional[int] = None) -> Iterator[Chunk]:
+        """Добавляет очередную страницу и отдаёт все заполненные чанки."""
+        if self._tail:
+            offset = len(self._tail) + 1
+            buffer = self._tail + " " + text
+        else:
+            offset = 0
+            buffer = text
+            self._offsets = []
+            self._pages = []
+        self._offsets.append(offset)
+        self._pages.append(page)
+        yield from self._drain(buffer, final=False)
+
+    def flush(self) -> Iterator[Chunk]:
+        """Отдаёт остаток буфера."""
+        if self._tail:
+            yield from self._drain(self._tail, final=True)
+        self._tail = ""
+        self._offsets = []
+        self._pages = []
+        self._carried = 0
+
+
+def chunk_pages(
+    pages: Iterable[Tuple[Optional[int], str]],
+    max_length: int = DEFAULT_MAX_LENGTH,
+    overlap: int = 0,
+    sentence_aware: bool = True,
+    length_fn: Callable[[str], int] = char_length,
+) -> Iterator[Chunk]:
+    """
+    Разбивает поток страниц (page_number, text) на чанки.
+    Чанки могут пересекать границы страниц; у каждого есть page_start/page_end.
+    """
+    chunker = Chunker(max_length, overlap, sentence_aware, length_fn)
+    for page_number, text in pages:
+        yield from chunker.feed(text, page_number)
+    yield from chunker.flush()
+
+
+def split_text(
+    text: str,
+    max_length: int = DEFAULT_MAX_LENGTH,
+    overlap: int = 0,
+    sentence_aware: bool = True,
+    length_fn: Callable[[str], int] = char_length,
+) -> List[str]:
+    """Разбивает одну строку на чанки длиной не более max_length."""
+    return [
+        chunk.text
+        for chunk in chunk_pages([(None, text)], max_length, overlap, sentence_aware, length_fn)
+    ]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Разбивает текст на предложения за один проход."""
+    sentences = []
+    start = None
+    end = None
+    for match in WORD_RE.finditer(text):
+        if start is None:
+            start = match.start()
+        end = match.end()
+        if SENTENCE_END_RE.search(match.group()):
+            sentences.append(text[start:end])
+            start = None
+    if start is not None:
+        sentences.append(text[start:end])
+    return sentences
@@ -1,4 +1,5 @@
 import weaviate
+from dedup import DedupIndex
 
 client = weaviate.connect_to_local()
 
@@ -10,3 +11,9 @@ except Exception as e:
     print("Ошибка при удалении коллекции:", e)
 
 client.close()
+
+# Индекс дедупликации ссылается на удалённые чанки — очищаем и его
+index = DedupIndex()
+index.clear()
+index.close()
+print("Индекс дедупликации очищен.")
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Поиск почти одинаковых чанков при загрузке книг (MinHash + LSH).
+#
+# Для каждого чанка считается MinHash-подпись по словесным шинглам.
+# Подпись режется на полосы (bands); чанки с совпадающей полосой — кандидаты,
+# для них оценивается сходство Жаккара по подписям. Подписи и полосы
+# хранятся в SQLite, поэтому дубликаты находятся между книгами и запусками.
+# Для каждого дубликата записывается канонический чанк, которому он равен.
+
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "dedup_index.sqlite"),
+)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # порог срабатывания LSH ≈ (1/BANDS)^(1/ROWS) ≈ 0.71
+
+_PRIME = (1 << 32) - 5
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class Duplicate(NamedTuple):
+    canonical_id: str
+    similarity: float
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def signature(text: str) -> np.ndarray:
+    """MinHash-подпись текста: NUM_PERM минимумов по перестановкам (a*x + b) mod p."""
+    hashes = np.fromiter((_hash32(s) for s in _shingles(text)), dtype=np.uint64)
+    if hashes.size == 0:
+        hashes = np.zeros(1, dtype=np.uint64)
+    # a, x < 2^32, поэтому произведение помещается в uint64
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def _bands(sig: np.ndarray):
+    for band in range(BANDS):
+        chunk = sig[band * ROWS:(band + 1) * ROWS].tobytes()
+        yield band, hashlib.blake2b(chunk, digest_size=8).digest()
+
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
+
+
+class DedupIndex:
+    def __init__(self, path: str = DEDUP_INDEX_PATH, threshold: float = DEDUP_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                chunk_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                chars INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                bucket BLOB NOT NULL,
+                chunk_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, bucket);
+            CREATE TABLE IF NOT EXISTS duplicates (
+                chunk_id TEXT PRIMARY KEY,
+                canonical_id TEXT NOT NULL,
+                similarity REAL NOT NULL,
+                chars INTEGER NOT NULL
+            );
+        """)
+
+    def find_duplicate(self, sig: np.ndarray) -> Optional[Duplicate]:
+        """Самый похожий уже загруженный чанк со сходством не ниже порога."""
+        candidates = set()
+        for band, bucket in _bands(sig):
+            rows = self.db.execute(
+                "SELECT chunk_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+            )
+            candidates.update(row[0] for row in rows)
+
+        best = None
+        for chunk_id in candidates:
+            row = self.db.execute("SELECT signature FROM signatures WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            score = similarity(sig, np.frombuffer(row[0], dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best.similarity):
+                best = Duplicate(chunk_id, score)
+        return best
+
+    def add(self, chunk_id: str, sig: np.ndarray, chars: int):
+        """Регистрирует загруженный (канонический) чанк."""
+        self.db.execute(
+            "INSERT OR REPLACE INTO signatures (chunk_id, signature, chars) VALUES (?, ?, ?)",
+            (chunk_id, sig.tobytes(), chars),
+        )
+        self.db.executemany(
+            "INSERT INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+            [(band, bucket, chunk_id) for band, bucket in _bands(sig)],
+        )
+
+    def record_duplicate(self, chunk_id: str, duplicate: Duplicate, chars: int):
+        self.db.execute(
+            "INSERT OR REPLACE INTO duplicates (chunk_id, canonical_id, similarity, chars) VALUES (?, ?, ?, ?)",
+            (chunk_id, duplicate.canonical_id, duplicate.similarity, chars),
+        )
+
+    def canonical_of(self, chunk_id: str) -> Optional[str]:
+        row = self.db.execute("SELECT canonical_id FROM duplicates WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        return row[0] if row else None
+
+    def report(self) -> dict:
+        kept, kept_chars = self.db.execute("SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM signatures").fetchone()
+        dups, dup_chars = self.db.execute("SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM duplicates").fetchone()
+        total_chars = kept_chars + dup_chars
+        return {
+            "chunks": kept,
+            "duplicates": dups,
+            "saved_chars": dup_chars,
+            "saved_ratio": dup_chars / total_chars if total_chars else 0.0,
+        }
+
+    def clear(self):
+        self.db.executescript("DELETE FROM signatures; DELETE FROM bands; DELETE FROM duplicates;")
+        self.db.commit()
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def format_report(report: dict) -> str:
+    return (
+        f"уникальных чанков: {report['chunks']}, дубликатов: {report['duplicates']}, "
+        f"сэкономлено символов: {report['saved_chars']} ({report['saved_ratio']:.1%})"
+    )
+
+
+if __name__ == "__main__":
+    # Оценка дубликатов в выгрузке чанков (load_chunks.py) без изменения основного индекса
+    path = sys.argv[1] if len(sys.argv) > 1 else "chunks.txt"
+    with open(path, encoding="utf-8") as f:
+        texts = [chunk.strip() for chunk in f.read().split("\n\n") if chunk.strip()]
+    index = DedupIndex(":memory:")
+    for i, text in enumerate(texts):
+        sig = signature(text)
+        duplicate = index.find_duplicate(sig)
+        if duplicate:
+            index.record_duplicate(f"chunk_{i}", duplicate, len(text))
+        else:
+            index.add(f"chunk_{i}", sig, len(text))
+    print(f"{path}: {format_report(index.report())}")
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+# Эмбеддинги предложений для семантического разбиения.
+#
+# Два бэкенда с одинаковым интерфейсом encode(sentences) -> np.ndarray
+# (нормированные векторы float32):
+#   * torch — SentenceTransformer в полной точности;
+#   * onnx  — та же модель, экспортированная в ONNX с динамическим
+#             int8-квантованием и запущенная через onnxruntime на CPU.
+# Бэкенд выбирается переменной окружения EMBEDDING_BACKEND.
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+HF_MODEL_NAME = f"sentence-transformers/{MODEL_NAME}"
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# 0 — по числу ядер
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", f"{MODEL_NAME}-onnx-int8"),
+)
+ONNX_MAX_LENGTH = 256  # как max_seq_length у SentenceTransformer для этой модели
+
+BACKENDS = ("torch", "onnx")
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+class TorchEncoder:
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(MODEL_NAME, device="cpu")
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        return self.model.encode(
+            sentences,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+
+
+class OnnxEncoder:
+    def __init__(
+        self,
+        model_dir: str = ONNX_DIR,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        threads: int = EMBEDDING_THREADS,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(model_path):
+            export_onnx(model_dir)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+        self.batch_size = batch_size
+
+    def _encode_batch(self, sentences: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(sentences)
+        input_ids = np.asarray([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling по маске и L2-нормализация, как в SentenceTransformer
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences: List[str]) -> np.ndarray:
+        if not sentences:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Сортировка по длине уменьшает паддинг внутри батча
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        result = [None] * len(sentences)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = self._encode_batch([sentences[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                result[i] = vector
+        return np.asarray(result, dtype=np.float32)
+
+
+def export_onnx(model_dir: str = ONNX_DIR):
+    """
+    Экспортирует модель в ONNX и квантует веса в int8.
+    Нужен только один раз: torch и transformers требуются лишь здесь.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    print(f"[LOG] Экспорт {HF_MODEL_NAME} в ONNX: {model_dir}")
+    start_time = time.time()
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_NAME)
+    model = AutoModel.from_pretrained(HF_MODEL_NAME).eval()
+
+    sample = tokenizer(["пример предложения"], return_tensors="pt")
+    # Порядок входов совпадает с позиционными аргументами BertModel.forward
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    quantize_dynamic(fp32_path, os.path.join(model_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(model_dir)
+    print(f"[LOG] Экспорт и квантование заняли {time.time() - start_time:.2f} секунд.")
+
+
+def get_encoder(backend: str = EMBEDDING_BACKEND):
+    """
+    Кодировщик выбранного бэкенда; создаётся один раз на процесс.
+    Потокобезопасен: вызов во время фоновой загрузки дождётся её.
+    """
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд эмбеддингов '{backend}', ожидается один из {BACKENDS}")
+    with _encoders_lock:
+        if backend not in _encoders:
+            print(f"[LOG] Загрузка модели {MODEL_NAME} (бэкенд {backend})...")
+            start_time = time.time()
+            _encoders[backend] = OnnxEncoder() if backend == "onnx" else TorchEncoder()
+            print(f"[LOG] Модель загружена за {time.time() - start_time:.2f} секунд.")
+    return _encoders[backend]
+
+
+def warm_up(backend: str = EMBEDDING_BACKEND) -> threading.Thread:
+    """Загружает модель в фоновом потоке, пока процесс занят другой работой."""
+    def load():
+        try:
+            get_encoder(backend)
+        except Exception as e:
+            print(f"[WARNING] Фоновая загрузка модели не удалась: {e}")
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    export_onnx()
@@ -5,6 +5,7 @@ import subprocess
 from fastapi import APIRouter, File, UploadFile
 from fastapi.responses import JSONResponse
 from typing import List
+from wv.wv_queries import invalidate_books_cache
 
 router = APIRouter()
 
@@ -28,6 +29,8 @@ async def upload_files(files: List[UploadFile] = File(...)):
         #    Используем sys.executable, чтобы гарантированно вызвать Python из текущего окружения
         script_path = os.path.join(os.path.dirname(__file__), "load_book.py")
         subprocess.run([sys.executable, script_path], check=True)
+        # Появились новые книги — список для фильтров нужно перечитать
+        invalidate_books_cache()
 
         # 3. Переносим все файлы из uploads в books, оставляя uploads пустой
         for filename in os.listdir(UPLOAD_DIR):
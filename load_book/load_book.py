@@ -1,27 +1,18 @@
 import os
+import sys
 import uuid
 import re
-import time
-from weaviate import WeaviateClient
-from weaviate.connect import ConnectionParams
-from weaviate.exceptions import WeaviateGRPCUnavailableError, WeaviateClosedClientError
-from weaviate.classes.config import Property, DataType, Configure
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer, util
-
-# Загрузка модели
-print("[LOG] Загрузка модели SentenceTransformer 'all-MiniLM-L6-v2'...")
-start_time = time.time()
-MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-print(f"[LOG] Модель загружена за {time.time() - start_time:.2f} секунд.")
 
-pdf_folder = "uploads"
+# Скрипт запускается отдельным процессом из load_book/, корень проекта добавляем вручную
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chunking import chunk_pages, split_text, split_sentences
+from wv import wv_schema
+from wv.wv_queries import timeout_config
+from embeddings import get_encoder, warm_up as warm_up_encoder
+import dedup
+from dedup import DedupIndex
 
-# Проверка наличия папки uploads
-if not os.path.exists(pdf_folder):
-    print(f"[ERROR] Папка '{pdf_folder}' не существует. Создайте её и добавьте PDF файлы.")
-else:
-    print(f"[LOG] Папка '{pdf_folder}' найдена, файлов: {len(os.listdir(pdf_folder))}")
+pdf_folder = "uploads"
 
 # Определение функций
 def remove_uuid_prefix(filename: str) -> str:
@@ -47,6 +38,8 @@ def parse_filename_for_title_author(pdf_filename: str):
     return book_title, author
 
 def extract_pages_and_metadata(pdf_path: str):
+    from pypdf import PdfReader
+
     pages = []
     metadata = {}
     try:
@@ -78,19 +71,6 @@ def clean_text(text: str) -> str:
     text = " ".join(text.split())
     return text
 
-def split_text(text: str, max_length: int = 1000) -> list:
-    chunks = []
-    while len(text) > max_length:
-        split_index = text.rfind(" ", 0, max_length)
-        if split_index == -1:
-            split_index = max_length
-        chunk = text[:split_index].strip()
-        chunks.append(chunk)
-        text = text[split_index:].strip()
-    if text:
-        chunks.append(text)
-    return chunks
-
 def is_noise_sentence(sent: str) -> bool:
     if len(sent.strip()) < 30:
         return True
@@ -100,17 +80,20 @@ def is_noise_sentence(sent: str) -> bool:
         return True
     return False
 
-def split_text_semantic(text: str, threshold: float = 0.35) -> list:
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+def split_text_semantic(text: str, threshold: float = 0.35, max_length: int = 1000, encoder=None) -> list:
+    sentences = split_sentences(text)
+    # Пустая или пробельная страница не даёт ни одного чанка
     if not sentences:
-        return [text]
+        return []
 
     # Отфильтровываем откровенный мусор
     filtered_sentences = [s for s in sentences if not is_noise_sentence(s)]
     if not filtered_sentences:
         return []
 
-    embeddings = MODEL.encode(filtered_sentences)
+    # Векторы нормированы, поэтому косинус соседних предложений — скалярное произведение
+    embeddings = (encoder or get_encoder()).encode(filtered_sentences)
+    similarities = (embeddings[:-1] * embeddings[1:]).sum(axis=1)
     chunks = []
     current_chunk = [filtered_sentences[0]]
 
@@ -118,7 +101,7 @@ def split_text_semantic(text: str, threshold: float = 0.35) -> list:
         prev = filtered_sentences[i-1]
         curr = filtered_sentences[i]
 
-        sim = util.cos_sim(embeddings[i-1], embeddings[i])
+        sim = similarities[i - 1]
 
         # Если текущее короткое — добавим его потом
         if 30 <= len(curr.strip()) <= 80 and len(curr.split()) <= 10:
@@ -138,23 +121,102 @@ def split_text_semantic(text: str, threshold: float = 0.35) -> list:
     if current_chunk:
         chunks.append(" ".join(current_chunk))
 
-    return chunks
+    # Семантические группы, не влезающие в бюджет, дорезаем общим разбивателем
+    return [piece for chunk in chunks for piece in split_text(chunk, max_length=max_length)]
+
+def iter_page_chunks(pages: list, use_semantic: bool = True):
+    """
+    Отдаёт кортежи (page_number, part, chunk) для страниц книги.
+    Простое разбиение идёт потоком по всей книге, поэтому чанк может
+    начаться на одной странице и закончиться на следующей; номер страницы
+    у такого чанка — страница, на которой он начинается.
+    """
+    if use_semantic:
+        for page in pages:
+            page_number = page["page_number"]
+            print(f"[LOG] Семантическое разбиение страницы {page_number}...")
+            chunks = split_text_semantic(clean_text(page["text"]), threshold=0.35)
+            print(f"[LOG] Страница {page_number}: разбито на {len(chunks)} частей")
+            for i, chunk in enumerate(chunks):
+                yield page_number, i + 1, chunk
+        return
+
+    print("[LOG] Простое разбиение книги...")
+    parts = {}
+    stream = ((page["page_number"], clean_text(page["text"])) for page in pages)
+    for chunk in chunk_pages(stream, max_length=1000):
+        parts[chunk.page_start] = parts.get(chunk.page_start, 0) + 1
+        yield chunk.page_start, parts[chunk.page_start], chunk.text
+
+def chunk_uuid(chunk_id: str) -> str:
+    """UUID объекта в Weaviate, однозначно выводимый из идентификатора чанка."""
+    from weaviate.util import generate_uuid5
+
+    return generate_uuid5(chunk_id)
+
+SOURCE_PROPERTIES = ["book_title", "author", "page_number", "other_book_titles", "other_authors", "other_pages"]
+
+def add_source_to_canonical(collection, canonical_id: str, book_title: str, author: str, page_number: int) -> bool:
+    """
+    Дописывает книгу, автора и страницу отброшенного дубликата в канонический
+    чанк, чтобы фильтр по книге находил общий отрывок и в другом издании.
+    Возвращает False, если канонического чанка нет в коллекции.
+    """
+    canonical_uuid = chunk_uuid(canonical_id)
+    canonical = collection.query.fetch_object_by_id(canonical_uuid, return_properties=SOURCE_PROPERTIES)
+    if canonical is None:
+        return False
+    props = canonical.properties
+    source = (book_title, author, page_number)
+    if source == (props.get("book_title"), props.get("author"), props.get("page_number")):
+        return True
+    sources = list(zip(
+        props.get("other_book_titles") or [],
+        props.get("other_authors") or [],
+        props.get("other_pages") or [],
+    ))
+    if source in sources:
+        return True
+    sources.append(source)
+    collection.data.update(uuid=canonical_uuid, properties={
+        "other_book_titles": [s[0] for s in sources],
+        "other_authors": [s[1] for s in sources],
+        "other_pages": [s[2] for s in sources],
+    })
+    return True
 
 def main():
+    # Проверка наличия папки uploads
+    if not os.path.exists(pdf_folder):
+        print(f"[ERROR] Папка '{pdf_folder}' не существует. Создайте её и добавьте PDF файлы.")
+    else:
+        print(f"[LOG] Папка '{pdf_folder}' найдена, файлов: {len(os.listdir(pdf_folder))}")
+
+    # Флаг для выбора семантического разбиения
+    use_semantic = True
+    # Модель эмбеддингов грузится в фоне, пока идёт подключение к Weaviate и чтение PDF
+    if use_semantic:
+        warm_up_encoder()
+
+    # weaviate и pypdf импортируются только при запуске загрузки, чтобы
+    # функции разбиения можно было использовать без них (bench/)
+    from weaviate import WeaviateClient
+    from weaviate.connect import ConnectionParams
+    from weaviate.exceptions import WeaviateGRPCUnavailableError, WeaviateClosedClientError
+
     # Настройка подключения к Weaviate
     print("[LOG] Настройка подключения к Weaviate...")
     connection_params = ConnectionParams(
         http={"host": "localhost",
               "port": 8080,
-              "secure": False,
-              "timeout": 2000},
+              "secure": False},
         grpc={"host": "localhost",
               "port": 50051,
-              "secure": False,
-              "timeout": 2000}
+              "secure": False}
     )
 
-    client = WeaviateClient(connection_params=connection_params)
+    # Таймауты задаются через WEAVIATE_*_TIMEOUT (см. wv/wv_queries.py)
+    client = WeaviateClient(connection_params=connection_params, additional_config=timeout_config())
     client._skip_init_checks = True
 
     try:
@@ -166,31 +228,15 @@ def main():
     except Exception as e:
         print("[ERROR] Ошибка подключения:", e)
 
-    # Создание коллекции
+    # Создание коллекции по общему описанию схемы (wv/wv_schema.py)
     try:
         print("[LOG] Создание коллекции 'Document'...")
-        client.collections.create(
-            "Document",
-            properties=[
-                Property(name="text", data_type=DataType.TEXT),
-                Property(name="filename", data_type=DataType.TEXT),
-                Property(name="book_title", data_type=DataType.TEXT),
-                Property(name="page_number", data_type=DataType.INT),
-                Property(name="edition_code", data_type=DataType.TEXT),
-                Property(name="author", data_type=DataType.TEXT)
-            ],
-            vectorizer_config=[
-                Configure.NamedVectors.text2vec_ollama(
-                    name="text",
-                    source_properties=["text"],
-                    api_endpoint="http://host.docker.internal:11434",  # If using Docker, use this to contact your local Ollama instance
-                    model="nomic-embed-text:latest",  # The model to use, e.g. "nomic-embed-text"
-                )
-            ],
-        )
-        print("[LOG] Коллекция 'Document' успешно создана.")
+        if wv_schema.create_collection(client):
+            print("[LOG] Коллекция 'Document' успешно создана.")
+        else:
+            print("[LOG] Коллекция 'Document' уже существует.")
     except Exception as e:
-        print("[WARNING] Ошибка создания коллекции (возможно, она уже существует):", e)
+        print("[WARNING] Ошибка создания коллекции:", e)
 
     # Получение коллекции
     document_collection = None
@@ -205,8 +251,9 @@ def main():
     except Exception as e:
         print("[ERROR] Ошибка получения схемы:", e)
 
-    # Флаг для выбора семантического разбиения
-    use_semantic = True
+    # Флаг отсева почти одинаковых чанков (разные издания, повторяющиеся страницы)
+    use_dedup = True
+    dedup_index = DedupIndex() if use_dedup else None
 
     # Обработка PDF файлов, если коллекция получена
     if document_collection is not None:
@@ -220,38 +267,59 @@ def main():
                 meta["book_title"] = book_title_from_name
                 meta["author"] = author_from_name
 
-                for page in pages:
-                    page_number = page["page_number"]
-                    cleaned_text = clean_text(page["text"])
-                    if use_semantic:
-                        print(f"[LOG] Семантическое разбиение страницы {page_number}...")
-                        chunks = split_text_semantic(cleaned_text, threshold=0.35)
-                    else:
-                        print(f"[LOG] Простое разбиение страницы {page_number}...")
-                        chunks = split_text(cleaned_text, max_length=1000)
-                    print(f"[LOG] Страница {page_number}: разбито на {len(chunks)} частей")
-                    for i, chunk in enumerate(chunks):
-                        data_object = {
-                            "text": chunk,
-                            "filename": f"{filename}_page_{page_number}_part_{i + 1}",
-                            "book_title": meta.get("book_title", "Unknown"),
-                            "page_number": page_number,
-                            "edition_code": meta.get("edition_code", "Unknown"),
-                            "author": meta.get("author", "Unknown")
-                        }
-                        try:
-                            uuid_val = document_collection.data.insert(data_object)
-                        except WeaviateClosedClientError as e:
-                            print(f"[WARNING] Клиент закрыт при добавлении '{data_object['filename']}', переподключаемся...", e)
-                            client._skip_init_checks = True
-                            client.connect()
-                            uuid_val = document_collection.data.insert(data_object)
-                            print(f"[LOG] Документ '{data_object['filename']}' успешно добавлен: {uuid_val}")
-                        except Exception as e:
-                            print(f"[ERROR] Ошибка при добавлении документа '{data_object['filename']}':", e)
+                for page_number, part, chunk in iter_page_chunks(pages, use_semantic):
+                    chunk_id = f"{filename}_page_{page_number}_part_{part}"
+                    if dedup_index is not None:
+                        signature = dedup.signature(chunk)
+                        duplicate = dedup_index.find_duplicate(signature)
+                        if duplicate:
+                            # Дубликат пропускается, только если его книга и страница
+                            # записаны в канонический чанк, иначе загружаем его сам
+                            try:
+                                merged = add_source_to_canonical(
+                                    document_collection, duplicate.canonical_id,
+                                    meta.get("book_title", "Unknown"), meta.get("author", "Unknown"), page_number,
+                                )
+                            except Exception as e:
+                                print(f"[ERROR] Не удалось дописать источник '{chunk_id}' в '{duplicate.canonical_id}':", e)
+                                merged = False
+                            if merged:
+                                dedup_index.record_duplicate(chunk_id, duplicate, len(chunk))
+                                print(f"[LOG] '{chunk_id}' дублирует '{duplicate.canonical_id}' (сходство {duplicate.similarity:.2f}), пропускаем")
+                                continue
+                            print(f"[WARNING] Канонический чанк '{duplicate.canonical_id}' недоступен, '{chunk_id}' загружается отдельно")
+
+                    data_object = {
+                        "text": chunk,
+                        "filename": chunk_id,
+                        "book_title": meta.get("book_title", "Unknown"),
+                        "page_number": page_number,
+                        "edition_code": meta.get("edition_code", "Unknown"),
+                        "author": meta.get("author", "Unknown")
+                    }
+                    uuid_val = None
+                    try:
+                        uuid_val = document_collection.data.insert(data_object, uuid=chunk_uuid(chunk_id))
+                    except WeaviateClosedClientError as e:
+                        print(f"[WARNING] Клиент закрыт при добавлении '{data_object['filename']}', переподключаемся...", e)
+                        client._skip_init_checks = True
+                        client.connect()
+                        uuid_val = document_collection.data.insert(data_object, uuid=chunk_uuid(chunk_id))
+                        print(f"[LOG] Документ '{data_object['filename']}' успешно добавлен: {uuid_val}")
+                    except Exception as e:
+                        print(f"[ERROR] Ошибка при добавлении документа '{data_object['filename']}':", e)
+                    # В индекс попадают только реально загруженные чанки
+                    if dedup_index is not None and uuid_val is not None:
+                        dedup_index.add(chunk_id, signature, len(chunk))
+                if dedup_index is not None:
+                    dedup_index.commit()
     else:
         print("[ERROR] Коллекция 'Document' недоступна, объекты не добавлены.")
 
+    if dedup_index is not None:
+        print(f"[LOG] Дедупликация: {dedup.format_report(dedup_index.report())}")
+        dedup_index.close()
+
     print("[LOG] Закрытие подключения к Weaviate...")
     client.close()
     print("=== Завершение работы скрипта load_book.py ===")
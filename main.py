@@ -13,17 +13,41 @@ for logger_name in (
 ):
     logging.getLogger(logger_name).setLevel(logging.ERROR)
 
+import asyncio
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from socket_manager import sio
 from socketio import ASGIApp
+from wv.wv_queries import list_books, warm_up
+from resilience import metrics
+from ollama_pool import pool as ollama_pool
 
 # Импортируем router из client_load_book
 from load_book.client_load_book import router as upload_router
 
+# Создаем логгер
+logger = logging.getLogger(__name__)
+
+# Тяжёлые зависимости загружаются в фоне после старта: сервер сразу
+# принимает подключения, а первый вопрос не ждёт импорта клиента Weaviate
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ollama_pool.start_health_checks()
+    asyncio.create_task(_warm_up())
+    yield
+    ollama_pool.stop_health_checks()
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(warm_up)
+        logger.info("🔥 Клиент Weaviate загружен")
+    except Exception as e:
+        logger.error(f"❌ Ошибка фоновой загрузки: {e}")
+
 # Инициализация FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Разрешаем CORS для всех источников
 app.add_middleware(
@@ -40,8 +64,6 @@ socket_app = ASGIApp(sio, other_asgi_app=app)
 # Подключаем router для загрузки файлов с префиксом /api
 app.include_router(upload_router, prefix="/api")
 
-# Создаем логгер
-logger = logging.getLogger(__name__)
 logger.info("🚀 Сервер FastAPI + Socket.IO запущен...")
 
 # Простая REST точка входа
@@ -50,6 +72,18 @@ def read_root():
     logger.info("📥 Запрос на корневой эндпоинт `/`")
     return {"message": "Hello from FastAPI + Socket.IO"}
 
+# Список загруженных книг для фильтров поиска (кэшируется в wv_queries)
+@app.get("/api/books")
+def get_books(refresh: bool = False):
+    logger.info("📥 Запрос списка книг `/api/books`")
+    return {"books": list_books(force_refresh=refresh)}
+
+# Счётчики деградаций (запасной поиск, сокращённые ответы), состояние выключателей
+# и загрузка бэкендов Ollama
+@app.get("/api/metrics")
+def get_metrics():
+    return {**metrics.snapshot(), "ollama": ollama_pool.snapshot()}
+
 # Функция запуска сервера
 def start():
     try:
@@ -1,33 +1,55 @@
+import asyncio
+import os
+import time
 import httpx
 import logging
-from typing import List, Dict, Optional
+from typing import List, Optional
 import json
+from wv.wv_queries import SearchHit
+from resilience import Deadline, metrics
+from ollama_pool import pool
 
 logger = logging.getLogger(__name__)
 
-Document = Dict[str, any]
+# Адреса бэкендов Ollama задаются в ollama_pool.py (OLLAMA_URLS)
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "owl/t-lite:latest")
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+# Таймаут генерации без бюджета запроса
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "60"))
+
+TRUNCATED_NOTE = "\n\n⚠️ Ответ сокращён: истекло время ожидания."
+FALLBACK_EXCERPTS = 3
+FALLBACK_EXCERPT_LENGTH = 500
+
+
+def fallback_answer(documents: List[SearchHit]) -> str:
+    """Ответ без модели: найденные отрывки с указанием книги и страницы."""
+    parts = ["⚠️ Генерация ответа сейчас недоступна. Наиболее подходящие отрывки:"]
+    for doc in documents[:FALLBACK_EXCERPTS]:
+        text = doc.text if len(doc.text) <= FALLBACK_EXCERPT_LENGTH else doc.text[:FALLBACK_EXCERPT_LENGTH] + "…"
+        parts.append(f'> {text}\n\n— {doc.author}, «{doc.book_title}», стр. {doc.page_number}')
+    return "\n\n".join(parts)
+
 
 async def ask_question(
     user_query: str,
-    documents: List[Document],
+    documents: List[SearchHit],
     sio,
-    socket_id: Optional[str] = None
+    room: Optional[str] = None,
+    deadline: Optional[Deadline] = None,
 ) -> str:
+    """
+    Потоковая генерация ответа на одном из бэкендов пула. Если бэкенд упал
+    до первого токена, вопрос повторяется на другом. С deadline генерация прерывается
+    по истечении срока: возвращается уже полученная часть ответа с пометкой,
+    а если не получено ничего — TimeoutError.
+    """
     # Формирование prompt на основе документов
     if documents:
         context_parts = []
         for doc in documents:
-            props = doc.get("properties", {}) if isinstance(doc, dict) else getattr(doc, "properties", {})
-            title = props.get("book_title")
-            author = props.get("author")
-            page = props.get("page_number", "")
-            try:
-                page_num = int(page) if page != "" else 1
-            except ValueError:
-                page_num = 1
-            text = props.get("text", "")
             context_parts.append(
-                f'Автор: {author} Название книги: "{title}" страница {page_num}\nОтрывок из этой страницы: {text}'
+                f'Автор: {doc.author} Название книги: "{doc.book_title}" страница {doc.page_number}\nОтрывок из этой страницы: {doc.text}'
             )
         context = "\n\n".join(context_parts)
         prompt = (
@@ -46,48 +68,95 @@ async def ask_question(
         )
 
     logger.info(f"Сформированный prompt:\n{prompt}")
-    full_response = ""
-
-    try:
-        # Устанавливаем таймаут в 60 секунд на случай медленной обработки
-        async with httpx.AsyncClient(
-            timeout=httpx.Timeout(60.0),
-            transport=httpx.AsyncHTTPTransport(proxy=None)
-        ) as client:
-            async with client.stream(
-                "POST",
-                "http://localhost:11434/api/chat",
-                json={
-                    "model": "owl/t-lite:latest",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "stream": True
-                }
-            ) as resp:
-                async for chunk in resp.aiter_text():
-                    for line in chunk.splitlines():
-                        if not line.strip():
-                            continue
-                        try:
-                            data = json.loads(line)
-                        except json.JSONDecodeError as e:
-                            logger.error(f"Ошибка разбора JSON: {e}. Строка: {line}")
-                            continue
-
-                        content = data.get("message", {}).get("content", "")
-                        full_response += content
-
-                        if socket_id:
-                            try:
-                                await sio.emit("partial answer", {"text": full_response}, to=socket_id)
-                            except Exception as sio_e:
-                                logger.error(f"Ошибка при отправке через Socket.IO: {sio_e}")
-        return full_response
-    except Exception as e:
-        logger.error(f"Ошибка при генерации ответа: {e}")
-        # Отправляем сообщение об ошибке клиенту, если socket_id указан
-        if socket_id:
-            try:
-                await sio.emit("chat message", {"text": "⚠️ Ошибка при генерации ответа."}, to=socket_id)
-            except Exception as sio_e:
-                logger.error(f"Ошибка при отправке сообщения об ошибке через Socket.IO: {sio_e}")
-        raise
+
+    if deadline is None:
+        deadline = Deadline(OLLAMA_TIMEOUT)
+    answer = _Answer()
+    tried = set()
+    while True:
+        backend = await pool.acquire(deadline, exclude=tried)
+        started = time.monotonic()
+        error = None
+        try:
+            truncated = await _stream_answer(backend.url, prompt, deadline, sio, room, answer)
+        except Exception as e:
+            error = e
+            logger.error(f"Ошибка при генерации ответа на {backend.url}: {e!r}")
+            # Пока клиенты не получили ни одного токена, вопрос можно
+            # незаметно передать другому бэкенду
+            if answer.tokens or deadline.expired():
+                raise
+            tried.add(backend)
+            metrics.incr("ollama_failover")
+            continue
+        finally:
+            await pool.release(backend, time.monotonic() - started, answer.tokens, error)
+        break
+
+    if truncated:
+        logger.warning("⏱️ Срок ответа истёк, отдаём сокращённый ответ")
+        metrics.incr("generation_truncated")
+        return answer.text + TRUNCATED_NOTE
+    return answer.text
+
+
+class _Answer:
+    __slots__ = ("text", "tokens")
+
+    def __init__(self):
+        self.text = ""
+        self.tokens = 0
+
+
+async def _stream_answer(url: str, prompt: str, deadline: Deadline, sio, room: Optional[str], answer: _Answer) -> bool:
+    """
+    Потоковый ответ одного бэкенда, токены дописываются в answer.
+    Возвращает True, если поток прерван по сроку после первых токенов.
+    """
+    remaining = deadline.remaining()
+    timeout = httpx.Timeout(remaining, connect=min(OLLAMA_CONNECT_TIMEOUT, remaining))
+    async with httpx.AsyncClient(
+        timeout=timeout,
+        transport=httpx.AsyncHTTPTransport(proxy=None)
+    ) as client:
+        async with client.stream(
+            "POST",
+            f"{url}/api/chat",
+            json={
+                "model": OLLAMA_MODEL,
+                "messages": [{"role": "user", "content": prompt}],
+                "stream": True
+            }
+        ) as resp:
+            resp.raise_for_status()
+            lines = resp.aiter_lines()
+            while True:
+                # Срок проверяется на каждой строке, а не только на отдельном чтении
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout=deadline.remaining())
+                except StopAsyncIteration:
+                    return False
+                except asyncio.TimeoutError:
+                    if not answer.tokens:
+                        raise TimeoutError("Ollama не ответил до истечения срока")
+                    return True
+
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.error(f"Ошибка разбора JSON: {e}. Строка: {line}")
+                    continue
+
+                content = data.get("message", {}).get("content", "")
+                if not content:
+                    continue
+                answer.text += content
+                answer.tokens += 1
+
+                if room:
+                    try:
+                        await sio.emit("partial answer", {"text": answer.text}, to=room)
+                    except Exception as sio_e:
+                        logger.error(f"Ошибка при отправке через Socket.IO: {sio_e}")
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+import httpx
+
+from resilience import Deadline, metrics
+
+logger = logging.getLogger(__name__)
+
+# Пул бэкендов Ollama для генерации.
+#
+# Адреса задаются в OLLAMA_URLS через запятую, у каждого можно указать
+# предел одновременных запросов: "http://10.0.0.2:11434|2". Запрос уходит
+# на здоровый бэкенд с наименьшей загрузкой (outstanding / max_concurrency);
+# если все заняты, он ждёт в общей очереди и достаётся первому освободившемуся,
+# поэтому упавший бэкенд не задерживает стоящие за ним запросы.
+# Бэкенд считается больным после ошибки соединения или ответа 5xx и
+# возвращается в пул фоновой проверкой GET /api/tags. Таймауты по сроку
+# запроса и ответы 4xx его не исключают.
+
+OLLAMA_URLS = os.getenv("OLLAMA_URLS") or os.getenv("OLLAMA_URL", "http://localhost:11434")
+# Ollama на CPU обрабатывает запросы по одному, поэтому по умолчанию 1
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+class QueueTimeout(TimeoutError):
+    """Срок истёк в очереди пула, до обращения к Ollama."""
+
+
+class Backend:
+    __slots__ = (
+        "url", "max_concurrency", "outstanding", "healthy", "last_error",
+        "requests", "failures", "tokens", "busy_seconds", "created",
+    )
+
+    def __init__(self, url: str, max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.outstanding = 0
+        # До первой проверки считаем бэкенд здоровым
+        self.healthy = True
+        self.last_error: Optional[str] = None
+        self.requests = 0
+        self.failures = 0
+        self.tokens = 0
+        self.busy_seconds = 0.0
+        self.created = time.monotonic()
+
+    def load(self) -> float:
+        return self.outstanding / self.max_concurrency
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "tokens": self.tokens,
+            # Скорость генерации одного запроса и общая пропускная способность бэкенда
+            "tokens_per_s": self.tokens / self.busy_seconds if self.busy_seconds else 0.0,
+            "throughput_tokens_per_s": self.tokens / (time.monotonic() - self.created),
+            "last_error": self.last_error,
+        }
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """Ошибка самого бэкенда: соединение не установлено или оборвано, либо ответ 5xx."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    # Таймауты httpx ограничены сроком запроса и о бэкенде ничего не говорят
+    return isinstance(error, httpx.TransportError) and not isinstance(error, httpx.TimeoutException)
+
+
+def parse_backends(spec: str) -> List[Backend]:
+    """'url[|max_concurrency],...' → список бэкендов."""
+    backends = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, limit = item.partition("|")
+        backends.append(Backend(url.strip(), int(limit) if limit else OLLAMA_MAX_CONCURRENCY))
+    if not backends:
+        raise ValueError("Не задан ни один адрес Ollama")
+    return backends
+
+
+class OllamaPool:
+    def __init__(self, backends: List[Backend], health_interval: float = OLLAMA_HEALTH_INTERVAL):
+        self.backends = backends
+        self.health_interval = health_interval
+        self.queued = 0
+        self._changed = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _pick(self, exclude) -> Optional[Backend]:
+        free = [
+            b for b in self.backends
+            if b.healthy and b not in exclude and b.outstanding < b.max_concurrency
+        ]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.load(), b.outstanding))
+
+    def _has_candidates(self, exclude) -> bool:
+        return any(b.healthy and b not in exclude for b in self.backends)
+
+    async def acquire(self, deadline: Deadline, exclude=()) -> Backend:
+        """
+        Наименее загруженный здоровый бэкенд не из exclude. Если все заняты,
+        ждёт освобождения до срока deadline (иначе QueueTimeout). Если подходящих здоровых
+        бэкендов нет совсем, сразу выбрасывает NoBackendAvailable.
+        """
+        self.start_health_checks()
+        async with self._changed:
+            self.queued += 1
+            try:
+                while True:
+                    if not self._has_candidates(exclude):
+                        raise NoBackendAvailable("Нет доступных бэкендов Ollama")
+                    backend = self._pick(exclude)
+                    if backend is not None:
+                        backend.outstanding += 1
+                        return backend
+                    remaining = deadline.remaining()
+                    if remaining <= 0:
+                        metrics.incr("ollama_queue_timeout")
+                        raise QueueTimeout("Истёк срок ожидания свободного бэкенда Ollama")
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.queued -= 1
+
+    async def release(self, backend: Backend, seconds: float, tokens: int, error: Optional[Exception] = None):
+        backend.outstanding -= 1
+        backend.requests += 1
+        backend.tokens += tokens
+        backend.busy_seconds += seconds
+        if error is not None:
+            backend.failures += 1
+            backend.last_error = repr(error)
+            if is_backend_failure(error):
+                if backend.healthy:
+                    logger.warning(f"⚠️ Бэкенд Ollama {backend.url} исключён из пула: {error!r}")
+                backend.healthy = False
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def check_health(self):
+        """Проверяет все бэкенды и возвращает в пул ответившие."""
+        async with httpx.AsyncClient(
+            timeout=OLLAMA_HEALTH_TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(proxy=None),
+        ) as client:
+            async def check(backend: Backend):
+                try:
+                    response = await client.get(f"{backend.url}/api/tags")
+                    response.raise_for_status()
+                except Exception as e:
+                    if backend.healthy:
+                        logger.warning(f"⚠️ Бэкенд Ollama {backend.url} не отвечает: {e!r}")
+                    backend.healthy = False
+                    backend.last_error = repr(e)
+                    return
+                if not backend.healthy:
+                    logger.info(f"✅ Бэкенд Ollama {backend.url} снова доступен")
+                backend.healthy = True
+
+            await asyncio.gather(*(check(backend) for backend in self.backends))
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"❌ Ошибка проверки бэкендов Ollama: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    def start_health_checks(self):
+        # Запускается при старте сервера (main.py) или при первом запросе
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self.queued,
+            "backends": [backend.snapshot() for backend in self.backends],
+        }
+
+
+pool = OllamaPool(parse_backends(OLLAMA_URLS))
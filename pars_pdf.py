@@ -2,10 +2,12 @@ import os
 from weaviate import WeaviateClient
 from weaviate.connect import ConnectionParams
 from weaviate.exceptions import WeaviateGRPCUnavailableError, WeaviateClosedClientError
-from weaviate.classes.config import Property, DataType, Configure
 from pypdf import PdfReader
 import weaviate
 
+from chunking import split_text
+from wv import wv_schema
+
 # Папка с PDF-файлами
 pdf_folder = "books"
 
@@ -25,28 +27,11 @@ def extract_text_pages(pdf_path: str) -> list:
         print(f"Ошибка при чтении {pdf_path}: {e}")
     return pages
 
-def split_text(text: str, max_length: int = 1000) -> list:
-    """
-    Разбивает текст на чанки длиной не более max_length символов.
-    Старается разбить по последнему переносу строки в пределах max_length.
-    """
-    chunks = []
-    while len(text) > max_length:
-        split_index = text.rfind("\n", 0, max_length)
-        if split_index == -1:
-            split_index = max_length
-        chunk = text[:split_index].strip()
-        chunks.append(chunk)
-        text = text[split_index:].strip()
-    if text:
-        chunks.append(text)
-    return chunks
-
 def parse_filename_for_book_and_author(filename: str) -> tuple:
     """
     Ожидается, что имя файла имеет вид:
         'Название книги ... Автор.pdf'
-    Функция возвращает кортеж (title__book, author).
+    Функция возвращает кортеж (book_title, author).
 
     Если формат не совпадает, в качестве автора возвращается пустая строка,
     а в качестве названия — имя файла без расширения.
@@ -74,29 +59,12 @@ except WeaviateGRPCUnavailableError as e:
 except Exception as e:
     print("Ошибка подключения:", e)
 
-# Создаём коллекцию "Document" с полями: text, filename, title__book, author, page_number
+# Создаём коллекцию "Document" по общему описанию схемы (wv/wv_schema.py)
 try:
-    client.collections.create(
-        "Document",
-        properties=[
-            Property(name="text", data_type=DataType.TEXT),
-            Property(name="filename", data_type=DataType.TEXT),
-            Property(name="title__book", data_type=DataType.TEXT),
-            Property(name="author", data_type=DataType.TEXT),
-            Property(name="page_number", data_type=DataType.INT)
-        ],
-        vectorizer_config=[
-                Configure.NamedVectors.text2vec_ollama(
-                    name="text",
-                    source_properties=["text"],
-                    api_endpoint="http://host.docker.internal:11434",  # If using Docker, use this to contact your local Ollama instance
-                    model="nomic-embed-text:latest",  # The model to use, e.g. "nomic-embed-text"
-                )
-            ]
-    )
-    print("Коллекция 'Document' успешно создана.")
+    if wv_schema.create_collection(client):
+        print("Коллекция 'Document' успешно создана.")
 except Exception as e:
-    print("Ошибка создания коллекции (возможно, она уже существует):", e)
+    print("Ошибка создания коллекции:", e)
 
 # Получаем коллекцию "Document" через схему
 document_collection = None
@@ -135,7 +103,7 @@ if document_collection is not None:
                         data_object = {
                             "text": chunk,
                             "filename": f"{filename}_page_{page_num}_part_{i+1}",
-                            "title__book": book_title,
+                            "book_title": book_title,
                             "author": book_author,
                             "page_number": page_num
                         }
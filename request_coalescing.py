@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Объединение одинаковых вопросов, которые обрабатываются одновременно.
+#
+# Первый запрос с данным ключом запускает поиск и генерацию («полёт»),
+# следующие просто подписываются на него. Подписчики — это комната
+# Socket.IO, поэтому промежуточные и финальный ответы рассылаются всем
+# одним emit. Каждый sid может отписаться сам; когда подписчиков не
+# остаётся, полёт отменяется вместе с генерацией в Ollama.
+
+FlightKey = Tuple[str, str, str]
+
+
+def normalize_query(text: str) -> str:
+    return " ".join((text or "").lower().split()).rstrip("?!. ")
+
+
+def flight_key(text: str, search_type: str, raw_filters: Optional[dict] = None) -> FlightKey:
+    filters_key = json.dumps(raw_filters or {}, sort_keys=True, ensure_ascii=False)
+    return normalize_query(text), str(search_type), filters_key
+
+
+class Flight:
+    __slots__ = ("key", "room", "subscribers", "task", "status")
+
+    def __init__(self, key: FlightKey):
+        self.key = key
+        self.room = f"flight:{uuid.uuid4().hex}"
+        self.subscribers = set()
+        self.task: Optional[asyncio.Task] = None
+        # Последний статус «loading answer», чтобы показать его опоздавшим
+        self.status: Optional[str] = None
+
+
+# Полёт возвращает финальное сообщение для чата
+FlightRunner = Callable[[Flight], Awaitable[object]]
+
+
+class FlightRegistry:
+    def __init__(self, sio):
+        self.sio = sio
+        self._flights: Dict[FlightKey, Flight] = {}
+        self._by_sid: Dict[str, Flight] = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def join(self, sid: str, key: FlightKey, run: FlightRunner) -> bool:
+        """
+        Подписывает sid на полёт с ключом key, запуская его при необходимости.
+        Возвращает True, если полёт был запущен этим запросом.
+        """
+        current = self._by_sid.get(sid)
+        if current is not None and current.key == key and current.task and not current.task.done():
+            # Повторно отправленный вопрос продолжает ждать уже идущий ответ
+            return False
+        # Один sid ждёт один ответ: новый вопрос заменяет предыдущую подписку
+        await self.leave(sid)
+
+        flight = self._flights.get(key)
+        started = flight is None
+        if started:
+            flight = Flight(key)
+            self._flights[key] = flight
+
+        flight.subscribers.add(sid)
+        self._by_sid[sid] = flight
+        await self.sio.enter_room(sid, flight.room)
+
+        if started:
+            flight.task = asyncio.create_task(self._run(flight, run))
+        else:
+            logger.info(f"🔗 {sid} присоединён к уже идущему запросу ({len(flight.subscribers)} подписчиков)")
+            if flight.status:
+                await self.sio.emit("loading answer", {"text": flight.status}, to=sid)
+        return started
+
+    async def leave(self, sid: str) -> bool:
+        """Отписывает sid от его полёта. Возвращает True, если подписка была."""
+        flight = self._by_sid.pop(sid, None)
+        if flight is None:
+            return False
+        flight.subscribers.discard(sid)
+        await self.sio.leave_room(sid, flight.room)
+        if not flight.subscribers and flight.task and not flight.task.done():
+            logger.info("🛑 Подписчиков не осталось, отменяем запрос")
+            flight.task.cancel()
+            # Отменённый полёт сразу убираем из реестра: тот же вопрос,
+            # заданный снова, должен запустить новый запрос
+            self._forget(flight)
+        return True
+
+    async def status(self, flight: Flight, text: str):
+        flight.status = text
+        await self.sio.emit("loading answer", {"text": text}, to=flight.room)
+
+    async def _run(self, flight: Flight, run: FlightRunner):
+        try:
+            try:
+                answer = await run(flight)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка при обработке запроса: {e}")
+                answer = "⚠️ Внутренняя ошибка сервера."
+            # Убираем полёт из реестра до рассылки ответа: новые вопросы
+            # с тем же ключом начнут свой запрос, а не получат пустую подписку
+            self._forget(flight)
+            await self.sio.emit("chat message", answer, to=flight.room)
+        finally:
+            self._forget(flight)
+            for sid in list(flight.subscribers):
+                if self._by_sid.get(sid) is flight:
+                    del self._by_sid[sid]
+                await self.sio.leave_room(sid, flight.room)
+            flight.subscribers.clear()
+
+    def _forget(self, flight: Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
@@ -0,0 +1,186 @@
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Бюджет времени на ответ, автоматические выключатели и счётчики деградаций.
+#
+# Каждый вопрос получает Deadline; поиск получает долю бюджета, генерация —
+# остаток. Выключатель (circuit breaker) после серии ошибок перестаёт
+# обращаться к зависимости на reset_timeout секунд, затем пропускает один
+# пробный запрос. Все деградации считаются в metrics и видны в /api/metrics.
+
+CHAT_LATENCY_BUDGET = float(os.getenv("CHAT_LATENCY_BUDGET", "120"))
+CHAT_MAX_LATENCY_BUDGET = float(os.getenv("CHAT_MAX_LATENCY_BUDGET", "300"))
+# Меньший budgetMs поднимается до этого значения: с почти нулевым бюджетом
+# поиск и генерация заведомо не успевают
+CHAT_MIN_LATENCY_BUDGET = float(os.getenv("CHAT_MIN_LATENCY_BUDGET", "10"))
+# Доля бюджета на поиск; из неё основной поиск получает PRIMARY_SEARCH_SHARE,
+# остаток остаётся на запасной поиск по ключевым словам
+RETRIEVAL_BUDGET_SHARE = float(os.getenv("RETRIEVAL_BUDGET_SHARE", "0.1"))
+PRIMARY_SEARCH_SHARE = 0.6
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+# Таймаут обращения, которому дали меньше этого времени, вызван бюджетом
+# запроса, а не зависимостью, и выключателем не считается
+BREAKER_MIN_TIMEOUT = float(os.getenv("BREAKER_MIN_TIMEOUT", "1"))
+
+
+class Deadline:
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def share(self, fraction: float) -> "Deadline":
+        """Дочерний срок: доля оставшегося времени."""
+        return Deadline(self.remaining() * fraction)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Время начала пробного запроса; пробу, которая так и не завершилась
+        # (например, отменённую), через reset_timeout заменяет новая
+        self._probe_started = None
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к зависимости."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_started = None
+        if self.state == self.HALF_OPEN:
+            # В полуоткрытом состоянии пропускаем ровно один пробный запрос
+            now = time.monotonic()
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probe_started = now
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"✅ Выключатель {self.name} закрыт")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.error(f"⛔ Выключатель {self.name} разомкнут после {self.failures} ошибок")
+                metrics.incr(f"{self.name}_circuit_opened")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_started = None
+
+    def record_timeout(self, allowed: float):
+        """
+        Таймаут обращения, которому дали allowed секунд. Короткий срок — следствие
+        бюджета запроса: ошибкой не считается и только освобождает пробный запрос.
+        """
+        if allowed >= BREAKER_MIN_TIMEOUT:
+            self.record_failure()
+        else:
+            self.record_skipped()
+
+    def record_skipped(self):
+        """Обращение ничего не сказало об исправности зависимости: освобождаем пробу."""
+        self._probe_started = None
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = Counter()
+        self.breakers = {}
+
+    def incr(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name)
+        return self.breakers[name]
+
+    def snapshot(self) -> dict:
+        return {
+            "degradations": dict(self.counters),
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+        }
+
+
+class ResultCache:
+    """LRU последних успешных результатов поиска — последний запасной вариант."""
+
+    def __init__(self, max_size: int = 512, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[list]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: list):
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+metrics = Metrics()
+weaviate_breaker = metrics.breaker("weaviate")
+ollama_breaker = metrics.breaker("ollama")
+
+
+def chat_deadline(budget_ms=None) -> Deadline:
+    """Срок ответа на вопрос: бюджет из сообщения клиента или по умолчанию."""
+    seconds = CHAT_LATENCY_BUDGET
+    if budget_ms not in (None, ""):
+        try:
+            seconds = float(budget_ms) / 1000
+        except (TypeError, ValueError):
+            raise ValueError(f"Некорректный budgetMs: {budget_ms}")
+        if seconds <= 0:
+            raise ValueError("budgetMs должен быть положительным")
+    return Deadline(min(max(seconds, CHAT_MIN_LATENCY_BUDGET), CHAT_MAX_LATENCY_BUDGET))
@@ -1,8 +1,23 @@
 import asyncio
 import logging
+import time
+import httpx
 from socketio import AsyncServer
-from wv.wv_queries import search_by_similarity, search_by_keyword, search_hybrid
-from ollama_client import ask_question
+from wv.wv_queries import search_by_similarity, search_by_keyword, search_hybrid, SearchFilters
+from ollama_client import ask_question, fallback_answer
+from ollama_pool import NoBackendAvailable, QueueTimeout
+from request_coalescing import Flight, FlightRegistry, flight_key
+from resilience import (
+    PRIMARY_SEARCH_SHARE,
+    RETRIEVAL_BUDGET_SHARE,
+    CircuitOpenError,
+    Deadline,
+    ResultCache,
+    chat_deadline,
+    metrics,
+    ollama_breaker,
+    weaviate_breaker,
+)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -11,6 +26,15 @@ logger = logging.getLogger(__name__)
 # Создаём экземпляр Socket.IO сервера с поддержкой CORS и логированием
 sio = AsyncServer(async_mode="asgi", cors_allowed_origins="*", logger=True, engineio_logger=True)
 
+# Идущие сейчас запросы для объединения одинаковых вопросов
+flights = FlightRegistry(sio)
+
+# 1 — гибридный поиск, 2 — по схожести, 3 — по ключевым словам
+SEARCH_TYPES = ("1", "2", "3")
+
+# Последние успешные результаты поиска — запасной вариант, когда Weaviate недоступен
+search_cache = ResultCache()
+
 # Подключение WebSocket
 @sio.event
 async def connect(sid, environ):
@@ -21,6 +45,7 @@ async def connect(sid, environ):
 @sio.event
 async def disconnect(sid):
     logger.info(f"❌ Socket отключён: {sid}")
+    await flights.leave(sid)
 
 # Глобальный обработчик всех событий для отладки
 @sio.on("*")
@@ -28,6 +53,175 @@ async def catch_all(event, sid, data):
     logger.info(f"🔥 WebSocket-событие: {event}, sid={sid}, data={data}")
 
 
+def _parse_page(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Некорректный номер страницы: {value}")
+
+def parse_filters(data: dict):
+    """
+    Фильтры поиска из сообщения клиента:
+    {"filters": {"bookTitle": ..., "author": ..., "pageFrom": ..., "pageTo": ...}}
+    bookTitle и author могут быть строкой или списком строк.
+    Возвращает значения, а не Filter: он собирается в потоке поиска.
+    """
+    raw = data.get("filters") or {}
+    if not isinstance(raw, dict):
+        raise ValueError("Поле filters должно быть объектом")
+    page_from = _parse_page(raw.get("pageFrom"))
+    page_to = _parse_page(raw.get("pageTo"))
+    if page_from is not None and page_to is not None and page_from > page_to:
+        raise ValueError("pageFrom больше pageTo")
+    return SearchFilters(
+        book_title=raw.get("bookTitle"),
+        author=raw.get("author"),
+        page_from=page_from,
+        page_to=page_to,
+    )
+
+
+async def _search(search, text: str, filters, timeout: float) -> list:
+    """Один поиск в Weaviate в отдельном потоке, не дольше timeout секунд."""
+    if not weaviate_breaker.allow():
+        raise CircuitOpenError("Weaviate временно недоступен")
+    started = time.monotonic()
+    try:
+        results = await asyncio.wait_for(
+            asyncio.to_thread(search, text, filters=filters, timeout=timeout),
+            timeout=timeout,
+        )
+    except Exception as e:
+        # Ошибка к концу срока — таймаут (wait_for или собственный у клиента
+        # Weaviate): при малом бюджете запроса Weaviate в нём не виноват
+        if isinstance(e, asyncio.TimeoutError) or time.monotonic() - started >= timeout:
+            weaviate_breaker.record_timeout(timeout)
+        else:
+            weaviate_breaker.record_failure()
+        raise
+    weaviate_breaker.record_success()
+    return results
+
+
+def _primary_search(search_type: str):
+    if search_type == "1":
+        return "гибридный поиск", search_hybrid
+    if search_type == "2":
+        return "поиск по схожести", search_by_similarity
+    return "поиск по ключевым словам", search_by_keyword
+
+
+async def retrieve(flight: Flight, text: str, search_type: str, filters, deadline: Deadline):
+    """
+    Поиск в пределах своей доли бюджета с запасными путями:
+    основной поиск → только по ключевым словам → кэш прошлых результатов.
+    Возвращает None, если найти ничего не удалось ни одним способом.
+    """
+    retrieval = deadline.share(RETRIEVAL_BUDGET_SHARE)
+    name, search = _primary_search(search_type)
+    # Для поиска по ключевым словам запасного поиска нет — он получает весь бюджет
+    share = PRIMARY_SEARCH_SHARE if search_type != "3" else 1.0
+
+    try:
+        print(f"🔍 Запускаем {name}...")
+        results = await _search(search, text, filters, retrieval.remaining() * share)
+        search_cache.put(flight.key, results)
+        return results
+    except CircuitOpenError:
+        print("⛔ Weaviate недоступен, пропускаем поиск")
+        metrics.incr("weaviate_circuit_open")
+    except asyncio.TimeoutError:
+        print(f"⏱️ {name} не уложился в бюджет")
+        metrics.incr("retrieval_timeout")
+    except Exception as e:
+        print(f"❌ Ошибка поиска: {e}")
+        metrics.incr("retrieval_error")
+
+    if search_type != "3" and weaviate_breaker.state != weaviate_breaker.OPEN:
+        await flights.status(flight, "Основной поиск недоступен, ищу по ключевым словам...")
+        metrics.incr("fallback_keyword")
+        try:
+            results = await _search(search_by_keyword, text, filters, retrieval.remaining())
+            search_cache.put(flight.key, results)
+            return results
+        except CircuitOpenError:
+            metrics.incr("weaviate_circuit_open")
+        except Exception as e:
+            print(f"❌ Запасной поиск не удался: {e!r}")
+
+    cached = search_cache.get(flight.key)
+    if cached:
+        await flights.status(flight, "Поиск недоступен, использую сохранённые результаты...")
+        metrics.incr("fallback_cache")
+        return cached
+
+    metrics.incr("retrieval_failed")
+    return None
+
+
+async def generate(flight: Flight, text: str, results: list, deadline: Deadline) -> str:
+    """Генерация в Ollama за остаток бюджета; при сбое — найденные отрывки без модели."""
+    if not ollama_breaker.allow():
+        print("⛔ Ollama недоступна, отвечаем отрывками")
+        metrics.incr("ollama_circuit_open")
+        return fallback_answer(results)
+
+    allowed = deadline.remaining()
+    try:
+        print("🧠 Передаём данные в Ollama...")
+        llm_answer = await ask_question(text, results, sio, flight.room, deadline=deadline)
+        print(f"✅ Ollama ответил: {llm_answer[:100]}...")
+    except (NoBackendAvailable, QueueTimeout) as e:
+        # Нет свободного здорового бэкенда: исправность бэкендов отслеживает
+        # пул, выключатель Ollama такие отказы не считает
+        print(f"⚠️ Нет свободного бэкенда Ollama: {e!r}")
+        ollama_breaker.record_skipped()
+        metrics.incr("generation_unavailable")
+        return fallback_answer(results)
+    except (TimeoutError, asyncio.TimeoutError, httpx.TimeoutException) as e:
+        print(f"⏱️ Ollama не ответил за {allowed:.1f} с: {e!r}")
+        ollama_breaker.record_timeout(allowed)
+        metrics.incr("generation_failed")
+        return fallback_answer(results)
+    except Exception as e:
+        print(f"❌ Ошибка в Ollama: {e!r}")
+        ollama_breaker.record_failure()
+        metrics.incr("generation_failed")
+        return fallback_answer(results)
+    ollama_breaker.record_success()
+    return llm_answer
+
+
+async def answer_question(flight: Flight, text: str, search_type: str, filters, deadline: Deadline) -> str:
+    """Поиск и генерация для одного полёта; все сообщения уходят в его комнату."""
+    # Отправляем промежуточное сообщение клиентам
+    print("🚀 Отправляем 'loading answer'...")
+    await flights.status(flight, "Ищу похожую информацию...")
+
+    # 📌 Выполняем поиск
+    results = await retrieve(flight, text, search_type, filters, deadline)
+    if results is None:
+        print("⚠️ Поиск недоступен.")
+        return "⚠️ Поиск по библиотеке сейчас недоступен, попробуйте позже."
+    print(f"🔍 Найдено документов: {len(results)}")
+
+    if results:
+        print(f"✅ Найдено {len(results)} документов. Передаём в Ollama...")
+    else:
+        print("⚠️ Weaviate не нашёл совпадений.")
+        return "⚠️ Weaviate не нашёл совпадений."
+
+    print("🚀 Отправляем 'loading answer'...")
+    await flights.status(flight, "Генерирую ответ...")
+
+    # Генерация ответа через Ollama, токены расходятся всем подписчикам
+    llm_answer = await generate(flight, text, results, deadline)
+    print(f"📤 Отправка ответа в чат: {llm_answer[:100]}...")
+    return llm_answer
+
+
 # Обработчик сообщений
 @sio.on("chat message")
 async def chat_message(sid, data):
@@ -38,57 +232,41 @@ async def chat_message(sid, data):
         text = data.get("text")
         search_type = data.get("searchType")
 
-        logger.info(f"🔍 Начинаем обработку: текст='{text}', поиск={search_type}")
-        print(f"🔍 Начинаем обработку: текст='{text}', поиск={search_type}")
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            print(f"⚠️ Некорректные фильтры: {e}")
+            await sio.emit("chat message", f"⚠️ Ошибка: {e}", room=sid)
+            return
 
-        # Отправляем промежуточное сообщение клиенту
-        print("🚀 Отправляем 'loading answer'...")
-        await sio.emit("loading answer", {"text": "Ищу похожую информацию..."}, room=sid)
-        # await asyncio.sleep(.1)
-
-        # 📌 Выполняем поиск
-        results = []
-        if search_type == "1":
-            print("🔍 Запускаем гибридный поиск...")
-            results = search_hybrid(text)
-            print(f"🔍 Найдено документов: {len(results)}")
-        elif search_type == "2":
-            print("🔍 Запускаем поиск по схожести...")
-            results = search_by_similarity(text)
-            print(f"🔍 Найдено документов: {len(results)}")
-        elif search_type == "3":
-            print("🔍 Запускаем поиск по ключевым словам...")
-            results = search_by_keyword(text)
-            print(f"🔍 Найдено документов: {len(results)}")
-        else:
+        if search_type not in SEARCH_TYPES:
             print("⚠️ Неизвестный тип поиска!")
             await sio.emit("chat message", "⚠️ Ошибка: неизвестный тип поиска.", room=sid)
             return
 
-        if results:
-            print(f"✅ Найдено {len(results)} документов. Передаём в Ollama...")
-        else:
-            print("⚠️ Weaviate не нашёл совпадений.")
-            await sio.emit("chat message", "⚠️ Weaviate не нашёл совпадений.", room=sid)
-            return  # Останавливаем выполнение
-
-        print("🚀 Отправляем 'loading answer'...")
-        await sio.emit("loading answer", {"text": "Генерирую ответ..."}, room=sid)
-        # await asyncio.sleep(.2)
-
-        # Генерация ответа через Ollama
+        # Бюджет времени на ответ: budgetMs из сообщения или CHAT_LATENCY_BUDGET.
+        # Присоединившиеся к идущему запросу получают ответ в его сроки
         try:
-            print("🧠 Передаём данные в Ollama...")
-            llm_answer = await ask_question(text, results, sio, sid)
-            print(f"✅ Ollama ответил: {llm_answer[:100]}...")
-        except Exception as e:
-            print(f"❌ Ошибка в Ollama: {e}")
-            llm_answer = "⚠️ Ошибка при генерации ответа."
+            deadline = chat_deadline(data.get("budgetMs"))
+        except ValueError as e:
+            await sio.emit("chat message", f"⚠️ Ошибка: {e}", room=sid)
+            return
+
+        logger.info(f"🔍 Начинаем обработку: текст='{text}', поиск={search_type}")
+        print(f"🔍 Начинаем обработку: текст='{text}', поиск={search_type}")
 
-        # Отправляем ответ клиенту
-        print(f"📤 Отправка ответа в чат: {llm_answer[:100]}...")
-        await sio.emit("chat message", llm_answer, room=sid)
+        # Одинаковые вопросы, заданные одновременно, обрабатываются один раз
+        key = flight_key(text, search_type, data.get("filters"))
+        await flights.join(sid, key, lambda flight: answer_question(flight, text, search_type, filters, deadline))
 
     except Exception as e:
         print(f"❌ Ошибка в обработке chat_message: {e}")
         await sio.emit("chat message", "⚠️ Внутренняя ошибка сервера.", room=sid)
+
+
+# Отмена ожидания ответа: отписываем только этот sid
+@sio.on("cancel")
+async def cancel(sid, data=None):
+    if await flights.leave(sid):
+        logger.info(f"🛑 {sid} отменил запрос")
+        await sio.emit("system message", {"text": "Запрос отменён."}, room=sid)
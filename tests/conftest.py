@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Тесты запускаются из корня проекта: python -m pytest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
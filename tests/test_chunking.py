@@ -0,0 +1,147 @@
+import random
+
+import pytest
+
+from chunking import Chunker, chunk_pages, split_sentences, split_text, token_length
+
+PUNCTUATION = ["", "", "", ",", ".", "!", "?", "…", ".»", ";"]
+
+
+def make_pages(rng: random.Random, pages: int, words_per_page: int) -> list:
+    """Страницы из уникальных слов, чтобы положение каждого чанка в тексте было однозначным."""
+    result = []
+    index = 0
+    for page in range(pages):
+        words = []
+        for _ in range(rng.randint(0, words_per_page)):
+            words.append("с" * rng.randint(1, 12) + str(index) + rng.choice(PUNCTUATION))
+            index += 1
+            if rng.random() < 0.05:
+                words.append(rng.choice(["\n", "\n\n", "\t", "  "]))
+        result.append((page + 1, " ".join(words)))
+    return result
+
+
+def locate(text: str, chunks: list) -> list:
+    """
+    Позиции чанков в тексте. Проверяет, что чанки — подстроки текста,
+    идут по порядку и вместе покрывают все непробельные символы.
+    """
+    spans = []
+    covered = 0
+    previous_start = -1
+    for chunk in chunks:
+        start = text.find(chunk, previous_start + 1)
+        assert start != -1, f"чанк не найден в тексте: {chunk!r}"
+        assert not text[covered:start].strip(), "между чанками потерян текст"
+        spans.append((start, start + len(chunk)))
+        covered = max(covered, start + len(chunk))
+        previous_start = start
+    assert not text[covered:].strip(), "потерян конец текста"
+    return spans
+
+
+def random_settings(rng: random.Random):
+    max_length = rng.randint(10, 400)
+    overlap = rng.choice([0, 0, rng.randint(1, max_length - 1)])
+    return max_length, overlap, rng.random() < 0.5
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_split_text_properties(seed):
+    rng = random.Random(seed)
+    text = " ".join(page for _, page in make_pages(rng, 1, 300))
+    max_length, overlap, sentence_aware = random_settings(rng)
+
+    chunks = split_text(text, max_length, overlap, sentence_aware)
+
+    for chunk in chunks:
+        assert chunk and chunk == chunk.strip()
+        assert len(chunk) <= max_length
+    spans = locate(text, chunks)
+    for (prev_start, prev_end), (start, end) in zip(spans, spans[1:]):
+        assert start > prev_start, "чанк не продвинулся"
+        assert prev_end - start <= overlap, "перекрытие больше заданного"
+    if overlap == 0:
+        # Слова длиннее бюджета режутся, поэтому сравниваем текст без пробелов
+        assert "".join("".join(chunks).split()) == "".join(text.split())
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_chunk_pages_reports_source_pages(seed):
+    rng = random.Random(seed)
+    pages = make_pages(rng, rng.randint(1, 8), 60)
+    max_length, overlap, sentence_aware = random_settings(rng)
+
+    chunks = list(chunk_pages(pages, max_length, overlap, sentence_aware))
+
+    # Страницы склеиваются через пробел, как в Chunker.feed
+    text = ""
+    offsets = []
+    for page_number, page_text in pages:
+        if offsets:
+            text += " "
+        offsets.append((len(text), page_number))
+        text += page_text
+
+    def page_at(pos):
+        return [page for offset, page in offsets if offset <= pos][-1]
+
+    for chunk, (start, end) in zip(chunks, locate(text, [chunk.text for chunk in chunks])):
+        assert len(chunk.text) <= max_length
+        assert chunk.page_start == page_at(start)
+        assert chunk.page_end == page_at(end - 1)
+
+
+@pytest.mark.parametrize("text", ["", " ", "  \n\t \r\n "])
+def test_empty_input_gives_no_chunks(text):
+    assert split_text(text) == []
+    assert list(chunk_pages([(1, text), (2, text)])) == []
+    assert split_sentences(text) == []
+
+
+@pytest.mark.parametrize("sentence_aware", [True, False])
+def test_word_longer_than_budget_is_cut(sentence_aware):
+    word = "x" * 2500
+    chunks = split_text(f"начало {word} конец.", max_length=1000, sentence_aware=sentence_aware)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert "".join("".join(chunks).split()) == f"начало{word}конец."
+
+
+def test_token_budget():
+    rng = random.Random(1)
+    text = " ".join(page for _, page in make_pages(rng, 1, 500))
+    chunks = split_text(text, max_length=50, length_fn=token_length)
+    assert all(len(chunk.split()) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+    def syllables(word):
+        return len(word) // 3 + 1
+
+    chunks = split_text(text, max_length=60, overlap=10, length_fn=syllables)
+    assert all(sum(syllables(word) for word in chunk.split()) <= 60 for chunk in chunks)
+    locate(text, chunks)
+
+    # Слово длиннее бюджета режется на части, каждая укладывается в бюджет
+    long_word = "".join(random.Random(2).choices("абвгдежзиклмнопрст", k=300))
+    text = "a b " + long_word + " c d"
+    for overlap in (0, 5):
+        chunks = split_text(text, max_length=20, overlap=overlap, length_fn=syllables)
+        assert all(sum(syllables(word) for word in chunk.split()) <= 20 for chunk in chunks)
+        locate(text, chunks)
+    assert "".join("".join(split_text(text, max_length=20, length_fn=syllables)).split()) == "".join(text.split())
+
+
+def test_chunk_crosses_page_boundary():
+    pages = [(1, "Первое предложение страницы один. Хвост без точки"), (2, "продолжается здесь. Конец.")]
+    chunks = list(chunk_pages(pages, max_length=80))
+    crossing = [chunk for chunk in chunks if chunk.page_start != chunk.page_end]
+    assert crossing
+    assert crossing[0].page_start == 1 and crossing[0].page_end == 2
+    assert "Хвост без точки продолжается здесь." in crossing[0].text
+
+
+@pytest.mark.parametrize("max_length, overlap", [(0, 0), (10, 10), (10, -1)])
+def test_invalid_settings(max_length, overlap):
+    with pytest.raises(ValueError):
+        Chunker(max_length, overlap)
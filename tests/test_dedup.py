@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import dedup
+from dedup import DedupIndex
+
+PASSAGE = (
+    "Идеальный конечный результат формулируется до поиска решения: система "
+    "сама выполняет нужную функцию, не усложняясь и не создавая вредных эффектов. "
+    "Противоречие обостряется, а не сглаживается компромиссом, и только затем "
+    "ищутся ресурсы, которые уже есть в системе и её окружении."
+)
+# То же место во втором издании: другая вёрстка и одно исправленное слово
+REPRINT = PASSAGE.replace("обостряется", "усиливается").replace(", и только", " и только")
+OTHER = (
+    "Вепольный анализ описывает систему как взаимодействие двух веществ и поля; "
+    "неполный веполь достраивают, вредный разрушают введением третьего вещества."
+)
+
+
+def test_signature_is_deterministic():
+    sig = dedup.signature(PASSAGE)
+    assert sig.dtype == np.uint32 and sig.shape == (dedup.NUM_PERM,)
+    assert np.array_equal(sig, dedup.signature(PASSAGE))
+    # Регистр и пунктуация на шинглы не влияют
+    assert dedup.similarity(sig, dedup.signature(PASSAGE.upper().replace(",", ""))) == 1.0
+    assert dedup.similarity(sig, dedup.signature(REPRINT)) >= dedup.DEDUP_THRESHOLD
+    assert dedup.similarity(sig, dedup.signature(OTHER)) < 0.2
+
+
+def test_find_duplicate_and_report():
+    index = DedupIndex(":memory:")
+    assert index.find_duplicate(dedup.signature(PASSAGE)) is None
+    index.add("first.pdf_page_1_part_1", dedup.signature(PASSAGE), len(PASSAGE))
+    index.add("first.pdf_page_2_part_1", dedup.signature(OTHER), len(OTHER))
+
+    duplicate = index.find_duplicate(dedup.signature(REPRINT))
+    assert duplicate is not None
+    assert duplicate.canonical_id == "first.pdf_page_1_part_1"
+    assert dedup.DEDUP_THRESHOLD <= duplicate.similarity < 1.0
+    index.record_duplicate("second.pdf_page_5_part_1", duplicate, len(REPRINT))
+    assert index.canonical_of("second.pdf_page_5_part_1") == "first.pdf_page_1_part_1"
+    assert index.canonical_of("first.pdf_page_1_part_1") is None
+
+    assert index.find_duplicate(dedup.signature("Совсем другой текст о сказках и фантастике.")) is None
+
+    report = index.report()
+    assert report["chunks"] == 2
+    assert report["duplicates"] == 1
+    assert report["saved_chars"] == len(REPRINT)
+    assert report["saved_ratio"] == pytest.approx(len(REPRINT) / (len(PASSAGE) + len(OTHER) + len(REPRINT)))
+
+    index.clear()
+    assert index.report() == {"chunks": 0, "duplicates": 0, "saved_chars": 0, "saved_ratio": 0.0}
+    index.close()
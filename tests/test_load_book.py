@@ -0,0 +1,56 @@
+import pytest
+
+from load_book import load_book
+
+
+class FailingEncoder:
+    def encode(self, sentences):
+        raise AssertionError("Для пустой страницы модель не должна вызываться")
+
+
+def test_semantic_split_of_empty_page_gives_no_chunks():
+    for text in ("", "   ", load_book.clean_text(" \n \r\n ")):
+        assert load_book.split_text_semantic(text, encoder=FailingEncoder()) == []
+
+
+def test_semantic_split_of_noise_gives_no_chunks():
+    assert load_book.split_text_semantic("1 ..... 2", encoder=FailingEncoder()) == []
+
+
+class FakeCollection:
+    """collection.query.fetch_object_by_id и collection.data.update над словарём объектов."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.query = self.data = self
+
+    def fetch_object_by_id(self, uuid, return_properties=None):
+        if uuid not in self.objects:
+            return None
+        return type("Object", (), {"properties": dict(self.objects[uuid])})()
+
+    def update(self, uuid, properties):
+        self.objects[uuid].update(properties)
+
+
+def test_duplicate_source_is_added_to_canonical():
+    pytest.importorskip("weaviate")
+    canonical_id = "first.pdf_page_1_part_1"
+    uuid = load_book.chunk_uuid(canonical_id)
+    collection = FakeCollection({uuid: {"book_title": "ТРИЗ", "author": "Альтшуллер", "page_number": 1}})
+
+    assert load_book.add_source_to_canonical(collection, canonical_id, "ТРИЗ. Второе издание", "Альтшуллер", 7)
+    # Повторная загрузка того же издания и сам канонический чанк источники не дублируют
+    assert load_book.add_source_to_canonical(collection, canonical_id, "ТРИЗ. Второе издание", "Альтшуллер", 7)
+    assert load_book.add_source_to_canonical(collection, canonical_id, "ТРИЗ", "Альтшуллер", 1)
+    assert load_book.add_source_to_canonical(collection, canonical_id, "Найти идею", "Альтшуллер", 3)
+    assert collection.objects[uuid] == {
+        "book_title": "ТРИЗ",
+        "author": "Альтшуллер",
+        "page_number": 1,
+        "other_book_titles": ["ТРИЗ. Второе издание", "Найти идею"],
+        "other_authors": ["Альтшуллер", "Альтшуллер"],
+        "other_pages": [7, 3],
+    }
+
+    assert not load_book.add_source_to_canonical(collection, "missing.pdf_page_1_part_1", "ТРИЗ", "Альтшуллер", 1)
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from ollama_pool import OLLAMA_MAX_CONCURRENCY, Backend, OllamaPool, QueueTimeout, is_backend_failure, parse_backends
+
+REQUEST = httpx.Request("POST", "http://ollama:11434/api/chat")
+
+
+def status_error(code):
+    return httpx.HTTPStatusError("ошибка", request=REQUEST, response=httpx.Response(code, request=REQUEST))
+
+
+@pytest.mark.parametrize("error, evicts", [
+    (httpx.ConnectError("connection refused", request=REQUEST), True),
+    (httpx.ReadError("connection reset", request=REQUEST), True),
+    (httpx.RemoteProtocolError("server disconnected", request=REQUEST), True),
+    (status_error(500), True),
+    (status_error(503), True),
+    (status_error(404), False),
+    (httpx.ReadTimeout("timed out", request=REQUEST), False),
+    (httpx.ConnectTimeout("timed out", request=REQUEST), False),
+    (TimeoutError("Ollama не ответил до истечения срока"), False),
+    (QueueTimeout("очередь"), False),
+    (ValueError("bad json"), False),
+])
+def test_release_evicts_only_on_backend_failures(error, evicts):
+    async def scenario():
+        backend = Backend("http://ollama:11434")
+        pool = OllamaPool([backend])
+        backend.outstanding = 1
+        await pool.release(backend, 1.0, 0, error)
+        return backend
+
+    backend = asyncio.run(scenario())
+    assert is_backend_failure(error) is evicts
+    assert backend.healthy is not evicts
+    assert backend.outstanding == 0 and backend.failures == 1
+    assert backend.last_error == repr(error)
+
+
+def test_parse_backends():
+    backends = parse_backends(" http://a:11434/|2, http://b:11434 ,")
+    assert [(b.url, b.max_concurrency) for b in backends] == [("http://a:11434", 2), ("http://b:11434", OLLAMA_MAX_CONCURRENCY)]
+    with pytest.raises(ValueError):
+        parse_backends(" , ")
@@ -0,0 +1,138 @@
+import asyncio
+
+from request_coalescing import FlightRegistry, flight_key
+
+
+class FakeSio:
+    """Комнаты и emit Socket.IO в памяти: сообщения в комнату получает каждый её участник."""
+
+    def __init__(self):
+        self.rooms = {}
+        self.received = []
+
+    async def enter_room(self, sid, room):
+        self.rooms.setdefault(room, set()).add(sid)
+
+    async def leave_room(self, sid, room):
+        self.rooms.get(room, set()).discard(sid)
+
+    async def emit(self, event, data, to=None):
+        for sid in sorted(self.rooms.get(to, {to})):
+            self.received.append((sid, event, data))
+
+
+def answers(sio, sid):
+    return [data for to, event, data in sio.received if to == sid and event == "chat message"]
+
+
+def test_resent_question_keeps_running_flight():
+    async def scenario():
+        sio = FakeSio()
+        flights = FlightRegistry(sio)
+        release = asyncio.Event()
+        started = []
+
+        async def run(flight):
+            started.append(flight)
+            await release.wait()
+            return "ответ"
+
+        key = flight_key("Что такое ТРИЗ?", "1")
+        assert await flights.join("a", key, run)
+        await asyncio.sleep(0)
+        # Тот же вопрос ещё раз: генерация не перезапускается
+        assert not await flights.join("a", flight_key("что такое триз", "1"), run)
+        await asyncio.sleep(0)
+        assert not started[0].task.done()
+        release.set()
+        await started[0].task
+
+        assert len(started) == 1
+        assert answers(sio, "a") == ["ответ"]
+        assert len(flights) == 0
+
+        # После ответа тот же вопрос запускает новый запрос
+        assert await flights.join("a", key, run)
+        await asyncio.sleep(0)
+        await started[1].task
+        assert answers(sio, "a") == ["ответ", "ответ"]
+
+    asyncio.run(scenario())
+
+
+def test_other_question_replaces_subscription():
+    async def scenario():
+        sio = FakeSio()
+        flights = FlightRegistry(sio)
+        release = asyncio.Event()
+        started = []
+
+        async def run(flight):
+            started.append(flight)
+            await release.wait()
+            return flight.key[0]
+
+        assert await flights.join("a", flight_key("первый вопрос", "1"), run)
+        await asyncio.sleep(0)
+        assert await flights.join("a", flight_key("второй вопрос", "1"), run)
+        await asyncio.sleep(0)
+        assert started[0].task.cancelled()
+        release.set()
+        await started[1].task
+
+        assert answers(sio, "a") == ["второй вопрос"]
+        assert len(flights) == 0
+
+    asyncio.run(scenario())
+
+
+def test_identical_questions_share_one_flight():
+    async def scenario():
+        sio = FakeSio()
+        flights = FlightRegistry(sio)
+        release = asyncio.Event()
+        calls = []
+
+        async def run(flight):
+            calls.append(flight)
+            await flights.status(flight, "ищу")
+            await release.wait()
+            return "ответ"
+
+        assert await flights.join("a", flight_key("Что такое ТРИЗ?", "1"), run)
+        await asyncio.sleep(0)
+        assert not await flights.join("b", flight_key("  что такое триз ", "1"), run)
+        release.set()
+        await calls[0].task
+
+        assert len(calls) == 1
+        assert answers(sio, "a") == answers(sio, "b") == ["ответ"]
+        assert ("b", "loading answer", {"text": "ищу"}) in sio.received
+        assert len(flights) == 0
+
+    asyncio.run(scenario())
+
+
+def test_last_subscriber_leaving_cancels_flight():
+    async def scenario():
+        sio = FakeSio()
+        flights = FlightRegistry(sio)
+        calls = []
+
+        async def run(flight):
+            calls.append(flight)
+            await asyncio.Event().wait()
+
+        key = flight_key("вопрос", "1")
+        await flights.join("a", key, run)
+        await flights.join("b", key, run)
+        await asyncio.sleep(0)
+        assert await flights.leave("a")
+        assert not calls[0].task.done()
+        assert await flights.leave("b")
+        assert len(flights) == 0
+        await asyncio.sleep(0)
+        assert calls[0].task.cancelled()
+        assert not await flights.leave("b")
+
+    asyncio.run(scenario())
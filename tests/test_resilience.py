@@ -0,0 +1,35 @@
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, chat_deadline
+
+
+def test_budget_is_clamped():
+    assert chat_deadline(1).remaining() == pytest.approx(resilience.CHAT_MIN_LATENCY_BUDGET, abs=0.1)
+    assert chat_deadline(10 ** 9).remaining() == pytest.approx(resilience.CHAT_MAX_LATENCY_BUDGET, abs=0.1)
+    assert chat_deadline(None).remaining() == pytest.approx(resilience.CHAT_LATENCY_BUDGET, abs=0.1)
+    for budget in (0, -5, "abc"):
+        with pytest.raises(ValueError):
+            chat_deadline(budget)
+
+
+def test_short_timeouts_do_not_open_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    for _ in range(10):
+        assert breaker.allow()
+        breaker.record_timeout(resilience.BREAKER_MIN_TIMEOUT / 10)
+    assert breaker.state == breaker.CLOSED and breaker.failures == 0
+
+    breaker.record_timeout(resilience.BREAKER_MIN_TIMEOUT)
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+
+def test_skipped_call_releases_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow() and breaker.state == breaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_timeout(0)
+    assert breaker.allow()
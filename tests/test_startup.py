@@ -0,0 +1,36 @@
+import importlib.util
+import subprocess
+import sys
+
+import pytest
+
+from bench.bench_startup import ROOT, TARGETS, measure
+
+# Сервер нельзя импортировать без его собственных зависимостей
+REQUIRES = {
+    "server": ["fastapi", "uvicorn", "socketio", "httpx"],
+    "load_book": ["numpy"],
+}
+
+
+@pytest.mark.parametrize("name", sorted(TARGETS))
+def test_heavy_modules_are_not_imported_at_startup(name):
+    missing = [module for module in REQUIRES[name] if importlib.util.find_spec(module) is None]
+    if missing:
+        pytest.skip(f"не установлены: {', '.join(missing)}")
+    result = measure(TARGETS[name], repeat=1, top=0)
+    assert result["forbidden_loaded"] == []
+
+
+def test_filtered_question_does_not_import_weaviate():
+    for module in REQUIRES["server"]:
+        pytest.importorskip(module)
+    # Фильтры разбираются в event loop, поэтому weaviate там импортироваться не должен
+    code = (
+        "import sys, socket_manager\n"
+        "filters = socket_manager.parse_filters({'filters': {'bookTitle': 'ТРИЗ', 'pageFrom': 3}})\n"
+        "assert filters.book_title == 'ТРИЗ' and filters.page_from == 3\n"
+        "assert 'weaviate' not in sys.modules, 'weaviate импортирован при разборе фильтров'\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr[-2000:]
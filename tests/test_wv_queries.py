@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("weaviate")
+
+from wv import wv_queries
+
+
+def book_group(title, author, chunks, author_property="author"):
+    return SimpleNamespace(
+        grouped_by=SimpleNamespace(value=title),
+        total_count=chunks,
+        properties={author_property: SimpleNamespace(top_occurrences=[SimpleNamespace(value=author, count=chunks)])},
+    )
+
+
+class FakeClient:
+    """client.collections.get(...).aggregate.over_all с заранее заданными группами по свойствам."""
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.calls = []
+        self.closed = False
+        self.collections = SimpleNamespace(get=lambda name: SimpleNamespace(aggregate=self))
+
+    def over_all(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(groups=self.groups.get(kwargs["group_by"].prop, []))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient({
+        "book_title": [book_group("ТРИЗ", "Альтшуллер", 12), book_group("Найти идею", "Альтшуллер", 5)],
+        # Второе издание целиком совпало с первым и есть только в other_book_titles
+        "other_book_titles": [
+            book_group("ТРИЗ. Второе издание", "Альтшуллер", 12, "other_authors"),
+            book_group("Найти идею", "Альтшуллер", 2, "other_authors"),
+        ],
+    })
+    monkeypatch.setattr(wv_queries, "get_client", lambda timeout=None: client)
+    monkeypatch.setattr(wv_queries, "_books_cache", {"expires": 0.0, "books": None})
+    return client
+
+
+def test_list_books(fake_client):
+    books = wv_queries.list_books()
+    assert books == [
+        {"book_title": "Найти идею", "author": "Альтшуллер", "chunks": 7, "shared_chunks": 2},
+        {"book_title": "ТРИЗ", "author": "Альтшуллер", "chunks": 12, "shared_chunks": 0},
+        {"book_title": "ТРИЗ. Второе издание", "author": "Альтшуллер", "chunks": 12, "shared_chunks": 12},
+    ]
+    assert fake_client.closed
+
+    # Повторный запрос берётся из кэша, force_refresh идёт в Weaviate
+    assert wv_queries.list_books() == books
+    assert len(fake_client.calls) == 2
+    wv_queries.list_books(force_refresh=True)
+    assert len(fake_client.calls) == 4
+
+
+def test_list_books_without_shared_sources(fake_client):
+    # Ошибка второго запроса не лишает списка обычных книг
+    def over_all(**kwargs):
+        if kwargs["group_by"].prop == "other_book_titles":
+            raise RuntimeError("no such property")
+        return SimpleNamespace(groups=fake_client.groups["book_title"])
+
+    fake_client.over_all = over_all
+    assert [book["book_title"] for book in wv_queries.list_books()] == ["Найти идею", "ТРИЗ"]
+
+
+def test_build_filters_from_search_filters():
+    assert wv_queries.build_filters(*wv_queries.SearchFilters()) is None
+    filters = wv_queries.build_filters(*wv_queries.SearchFilters(book_title="ТРИЗ", page_from=3, page_to=10))
+    assert filters is not None
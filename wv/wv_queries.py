@@ -1,7 +1,27 @@
 import logging
-import weaviate
-from weaviate.classes.query import MetadataQuery
-from weaviate.classes.config import Configure
+import os
+import threading
+import time
+from typing import List, NamedTuple, Optional, Union
+from wv import wv_schema
+
+# Клиент weaviate импортируется при первом обращении к базе (или в фоновом
+# прогреве warm_up), а не при импорте модуля: его загрузка занимает
+# заметную часть запуска сервера
+_import_lock = threading.Lock()
+
+def _load_weaviate():
+    """
+    Импортирует weaviate под блокировкой. Одновременный первый импорт из
+    потока прогрева и из обработчика запроса ломается на циклических
+    импортах внутри пакета; после загрузки вызов почти ничего не стоит.
+    """
+    with _import_lock:
+        import weaviate
+        import weaviate.classes.aggregate
+        import weaviate.classes.init
+        import weaviate.classes.query
+    return weaviate
 
 # Настройки логирования
 logging.basicConfig(level=logging.INFO)
@@ -9,42 +29,39 @@ logger = logging.getLogger(__name__)
 
 # URL Weaviate
 WEAVIATE_URL = "http://localhost:8080"
-CLASS_NAME = "Document"
+CLASS_NAME = wv_schema.CLASS_NAME
+
+# Время жизни кэша списка книг, секунд
+BOOKS_CACHE_TTL = 300
+_books_cache = {"expires": 0.0, "books": None}
+
+# Таймауты Weaviate, секунд. Запросы из чата получают query из своего бюджета
+WEAVIATE_INIT_TIMEOUT = float(os.getenv("WEAVIATE_INIT_TIMEOUT", "2"))
+WEAVIATE_QUERY_TIMEOUT = float(os.getenv("WEAVIATE_QUERY_TIMEOUT", "30"))
+WEAVIATE_INSERT_TIMEOUT = float(os.getenv("WEAVIATE_INSERT_TIMEOUT", "90"))
+MIN_QUERY_TIMEOUT = 0.1
+
+def timeout_config(query: Optional[float] = None):
+    _load_weaviate()
+    from weaviate.classes.init import AdditionalConfig, Timeout
+
+    query = WEAVIATE_QUERY_TIMEOUT if query is None else max(query, MIN_QUERY_TIMEOUT)
+    return AdditionalConfig(timeout=Timeout(
+        init=min(WEAVIATE_INIT_TIMEOUT, query),
+        query=query,
+        insert=WEAVIATE_INSERT_TIMEOUT,
+    ))
 
 # Функция создания клиента Weaviate
-def get_client():
-    return weaviate.connect_to_local(skip_init_checks=True)
+def get_client(timeout: Optional[float] = None):
+    weaviate = _load_weaviate()
+    return weaviate.connect_to_local(skip_init_checks=True, additional_config=timeout_config(timeout))
 
 # Функция для создания коллекции (если её нет)
-def create_collection():
+def create_collection(**index_options):
     client = get_client()
     try:
-        existing_collections = client.collections.list_all()
-        if CLASS_NAME in existing_collections:
-            logger.info(f"📚 Коллекция {CLASS_NAME} уже существует.")
-            return
-
-        client.collections.create(
-            name=CLASS_NAME,
-            description="Collection for storing book excerpts with semantic search",
-            properties=[
-                {"name": "author", "dataType": "text"},
-                {"name": "title", "dataType": "text"},
-                {"name": "page", "dataType": "int"},
-                {"name": "published_year", "dataType": "int"},
-                {"name": "text", "dataType": "text"},
-                {"name": "language", "dataType": "text"},
-            ],
-            vectorizer_config=[
-                Configure.NamedVectors.text2vec_ollama(
-                    name="text_vector",
-                    source_properties=["text"],
-                    api_endpoint="http://host.docker.internal:11434",  # If using Docker, use this to contact your local Ollama instance
-                    model="nomic-embed-text:latest",  # The model to use, e.g. "nomic-embed-text"
-                )
-            ]
-        )
-        logger.info(f"✅ Коллекция {CLASS_NAME} успешно создана.")
+        wv_schema.create_collection(client, CLASS_NAME, **index_options)
     except Exception as e:
         logger.error(f"❌ Ошибка при создании коллекции: {e}")
     finally:
@@ -62,55 +79,234 @@ def add_document(document: dict):
     finally:
         client.close()  # Закрываем соединение
 
-def search_by_similarity(query_text: str):
+class SearchFilters(NamedTuple):
+    """
+    Значения фильтров поиска без классов weaviate. Filter из них собирается
+    внутри функции поиска, в её потоке: обработчик сообщения в event loop
+    не ждёт импорта weaviate, который может держать фоновый прогрев.
+    """
+    book_title: Optional[Union[str, List[str]]] = None
+    author: Optional[Union[str, List[str]]] = None
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+
+def build_filters(
+    book_title: Optional[Union[str, List[str]]] = None,
+    author: Optional[Union[str, List[str]]] = None,
+    page_from: Optional[int] = None,
+    page_to: Optional[int] = None,
+):
+    """
+    Собирает фильтр Weaviate по метаданным чанка.
+    Фильтр применяется внутри Weaviate до ранжирования, поэтому поиск идёт
+    только среди подходящих объектов. Без условий возвращает None.
+    Книга и автор совпадают и с источниками отброшенных дубликатов
+    (other_book_titles, other_authors); диапазон страниц проверяется
+    по странице канонического чанка.
+    """
+    # Без условий weaviate не нужен — вопрос без фильтров не ждёт его импорта
+    if not (book_title or author) and page_from is None and page_to is None:
+        return None
+
+    _load_weaviate()
+    from weaviate.classes.query import Filter
+
+    conditions = []
+    for prop, other, value in (
+        ("book_title", "other_book_titles", book_title),
+        ("author", "other_authors", author),
+    ):
+        if not value:
+            continue
+        values = list(value) if isinstance(value, (list, tuple)) else [value]
+        if len(values) == 1:
+            own = Filter.by_property(prop).equal(values[0])
+        else:
+            own = Filter.by_property(prop).contains_any(values)
+        conditions.append(Filter.any_of([own, Filter.by_property(other).contains_any(values)]))
+    if page_from is not None:
+        conditions.append(Filter.by_property("page_number").greater_or_equal(page_from))
+    if page_to is not None:
+        conditions.append(Filter.by_property("page_number").less_or_equal(page_to))
+    return Filter.all_of(conditions)
+
+def list_books(force_refresh: bool = False) -> list:
+    """
+    Список загруженных книг: название, автор и число чанков.
+    Издания, чьи чанки при загрузке оказались дубликатами (dedup.py), есть
+    только в other_book_titles канонических чанков — они тоже попадают
+    в список; shared_chunks — сколько чанков книга делит с другими.
+    Результат кэшируется на BOOKS_CACHE_TTL секунд.
+    """
+    now = time.monotonic()
+    if not force_refresh and _books_cache["books"] is not None and now < _books_cache["expires"]:
+        return _books_cache["books"]
+
+    _load_weaviate()
+    from weaviate.classes.aggregate import GroupByAggregate
+    from weaviate.classes.query import Metrics
+
     client = get_client()
+    try:
+        collection = client.collections.get(CLASS_NAME)
+        response = collection.aggregate.over_all(
+            group_by=GroupByAggregate(prop="book_title"),
+            total_count=True,
+            return_metrics=Metrics("author").text(top_occurrences_value=True),
+        )
+        books = {}
+        for group in response.groups:
+            top_authors = group.properties["author"].top_occurrences
+            books[group.grouped_by.value] = {
+                "book_title": group.grouped_by.value,
+                "author": top_authors[0].value if top_authors else "Unknown",
+                "chunks": group.total_count,
+                "shared_chunks": 0,
+            }
+        try:
+            shared = collection.aggregate.over_all(
+                group_by=GroupByAggregate(prop="other_book_titles"),
+                total_count=True,
+                return_metrics=Metrics("other_authors").text(top_occurrences_value=True),
+            )
+        except Exception as e:
+            # Без источников дубликатов список всё равно полезен
+            logger.warning(f"⚠️ Не удалось получить книги из дубликатов: {e}")
+            shared = None
+        for group in shared.groups if shared else []:
+            top_authors = group.properties["other_authors"].top_occurrences
+            book = books.setdefault(group.grouped_by.value, {
+                "book_title": group.grouped_by.value,
+                "author": top_authors[0].value if top_authors else "Unknown",
+                "chunks": 0,
+                "shared_chunks": 0,
+            })
+            book["chunks"] += group.total_count
+            book["shared_chunks"] += group.total_count
+        books = sorted(books.values(), key=lambda book: book["book_title"])
+        _books_cache["books"] = books
+        _books_cache["expires"] = now + BOOKS_CACHE_TTL
+        return books
+    except Exception as e:
+        logger.error(f"❌ Ошибка при получении списка книг: {e}")
+        return _books_cache["books"] or []
+    finally:
+        client.close()
+
+def invalidate_books_cache():
+    _books_cache["expires"] = 0.0
+
+def warm_up():
+    """Импортирует клиент weaviate заранее, чтобы первый вопрос не ждал загрузки."""
+    _load_weaviate()
+
+# Свойства, которые нужны для prompt — остальные из Weaviate не запрашиваем
+RETURN_PROPERTIES = ["text", "book_title", "author", "page_number"]
+
+
+class SearchHit:
+    """Компактный результат поиска: только поля для prompt и оценка."""
+    __slots__ = ("text", "book_title", "author", "page_number", "score")
+
+    def __init__(self, text: str, book_title: str, author: str, page_number: int, score: Optional[float]):
+        self.text = text
+        self.book_title = book_title
+        self.author = author
+        self.page_number = page_number
+        self.score = score
+
+    def __repr__(self):
+        return f"SearchHit({self.book_title!r}, page={self.page_number}, score={self.score})"
+
+
+def _to_hits(objects, score_field: str) -> List[SearchHit]:
+    hits = []
+    for o in objects:
+        props = o.properties
+        hits.append(SearchHit(
+            text=props.get("text") or "",
+            book_title=props.get("book_title") or "Unknown",
+            author=props.get("author") or "Unknown",
+            page_number=props.get("page_number") or 1,
+            score=getattr(o.metadata, score_field),
+        ))
+    return hits
+
+# Ошибки поиска пробрасываются: socket_manager учитывает их в выключателе
+# Weaviate и переходит к запасному поиску
+def search_by_similarity(query_text: str, filters: Optional[SearchFilters] = None, timeout: Optional[float] = None) -> List[SearchHit]:
+    _load_weaviate()
+    from weaviate.classes.query import MetadataQuery
+
+    client = get_client(timeout)
     try:
         collection = client.collections.get(CLASS_NAME)
         response = collection.query.near_text(
             query=query_text,
+            return_properties=RETURN_PROPERTIES,
             return_metadata=MetadataQuery(distance=True),
-            distance=0.6
+            include_vector=False,
+            distance=0.6,
+            filters=build_filters(*filters) if filters is not None else None,
         )
-        for o in response.objects:
-            print(o.metadata.distance)
-        return response.objects
+        hits = _to_hits(response.objects, "distance")
+        logger.debug(f"Расстояния: {[hit.score for hit in hits]}")
+        return hits
     except Exception as e:
         logger.error(f"❌ Ошибка при семантическом поиске: {e}")
-        return []
+        raise
+    finally:
+        client.close()
 
-def search_by_keyword(query_text: str, limit: int = 6) -> list:
-    client = get_client()
+def search_by_keyword(query_text: str, limit: int = 6, filters: Optional[SearchFilters] = None, timeout: Optional[float] = None) -> List[SearchHit]:
+    _load_weaviate()
+    from weaviate.classes.query import MetadataQuery
+
+    client = get_client(timeout)
     try:
         collection = client.collections.get(CLASS_NAME)
         response = collection.query.bm25(
             query=query_text,
             limit=limit,
+            return_properties=RETURN_PROPERTIES,
             return_metadata=MetadataQuery(score=True),
+            include_vector=False,
+            filters=build_filters(*filters) if filters is not None else None,
         )
-        for o in response.objects:
-            print(o.metadata.score)
-        return response.objects
+        hits = _to_hits(response.objects, "score")
+        logger.debug(f"Оценки BM25: {[hit.score for hit in hits]}")
+        return hits
     except Exception as e:
         logger.error(f"❌ Ошибка при поиске по ключевым словам: {e}")
-        return []
+        raise
+    finally:
+        client.close()
 
 
-def search_hybrid(query_text: str, alpha: float = 0.7):
-    client = get_client()
+def search_hybrid(query_text: str, alpha: float = 0.7, filters: Optional[SearchFilters] = None, timeout: Optional[float] = None) -> List[SearchHit]:
+    _load_weaviate()
+    from weaviate.classes.query import MetadataQuery
+
+    client = get_client(timeout)
     try:
         collection = client.collections.get(CLASS_NAME)
         response = collection.query.hybrid(
             query=query_text,
             alpha=alpha,
             limit = 10,
-            return_metadata=MetadataQuery(score=True, explain_score=True)
+            return_properties=RETURN_PROPERTIES,
+            return_metadata=MetadataQuery(score=True),
+            include_vector=False,
+            filters=build_filters(*filters) if filters is not None else None,
         )
-        for o in response.objects:
-            print(o.metadata.score, o.metadata.explain_score)
-        return response.objects
+        hits = _to_hits(response.objects, "score")
+        logger.debug(f"Гибридные оценки: {[hit.score for hit in hits]}")
+        return hits
     except Exception as e:
         logger.error(f"❌ Ошибка при гибридном поиске: {e}")
-        return []
+        raise
+    finally:
+        client.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+import logging
+import os
+from typing import Optional
+
+# Единое описание коллекции Document: свойства, векторизатор и настройки
+# HNSW-индекса. Все скрипты создают коллекцию только через этот модуль.
+# Классы weaviate импортируются внутри функций: модуль с константами
+# импортируют сервер и скрипты, которым сам клиент Weaviate не нужен.
+
+logger = logging.getLogger(__name__)
+
+CLASS_NAME = "Document"
+VECTOR_NAME = "text"
+
+OLLAMA_ENDPOINT = "http://host.docker.internal:11434"  # Из Docker до локального Ollama
+EMBEDDING_MODEL = "nomic-embed-text:latest"
+
+# Имя свойства, тип данных Weaviate (DataType) и токенизация (Tokenization).
+# Название книги и автор токенизируются целиком (FIELD): фильтры equal и
+# contains_any сравнивают всё значение, а не отдельные слова, иначе
+# "Война" находит "Война и мир". Токенизация задаётся только при создании
+# коллекции — созданную раньше коллекцию нужно пересоздать и загрузить заново.
+PROPERTY_TYPES = [
+    ("text", "TEXT", None),
+    ("filename", "TEXT", None),
+    ("book_title", "TEXT", "FIELD"),
+    ("author", "TEXT", "FIELD"),
+    ("page_number", "INT", None),
+    ("edition_code", "TEXT", None),
+    # Источники почти одинаковых чанков, отброшенных при загрузке (dedup.py):
+    # книга, автор и страница дубликата дописываются каноническому чанку
+    # одинаковыми по длине списками, и фильтры по книге и автору учитывают их
+    ("other_book_titles", "TEXT_ARRAY", "FIELD"),
+    ("other_authors", "TEXT_ARRAY", "FIELD"),
+    ("other_pages", "INT_ARRAY", None),
+]
+
+# Параметры HNSW. ef влияет только на поиск и меняется на живой коллекции,
+# ef_construction и max_connections задаются при создании индекса.
+# Значения по умолчанию совпадают с умолчаниями Weaviate.
+HNSW_EF = int(os.getenv("WEAVIATE_HNSW_EF", "-1"))  # -1 — динамический ef
+HNSW_EF_CONSTRUCTION = int(os.getenv("WEAVIATE_HNSW_EF_CONSTRUCTION", "128"))
+HNSW_MAX_CONNECTIONS = int(os.getenv("WEAVIATE_HNSW_MAX_CONNECTIONS", "32"))
+# Сжатие векторов: none, pq (product quantization) или bq (binary quantization)
+VECTOR_COMPRESSION = os.getenv("WEAVIATE_VECTOR_COMPRESSION", "none").lower()
+PQ_SEGMENTS = int(os.getenv("WEAVIATE_PQ_SEGMENTS", "0"))  # 0 — Weaviate выберет сам
+PQ_TRAINING_LIMIT = int(os.getenv("WEAVIATE_PQ_TRAINING_LIMIT", "100000"))
+
+COMPRESSION_TYPES = ("none", "pq", "bq")
+
+
+def properties() -> list:
+    from weaviate.classes.config import DataType, Property, Tokenization
+
+    return [
+        Property(
+            name=name,
+            data_type=getattr(DataType, data_type),
+            tokenization=getattr(Tokenization, tokenization) if tokenization else None,
+        )
+        for name, data_type, tokenization in PROPERTY_TYPES
+    ]
+
+
+def _check_compression(compression: str) -> str:
+    compression = (compression or "none").lower()
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Неизвестный тип сжатия '{compression}', ожидается один из {COMPRESSION_TYPES}")
+    return compression
+
+
+def quantizer_config(compression: str = VECTOR_COMPRESSION, reconfigure: bool = False):
+    """Настройки квантования для создания (или изменения) индекса; None — без сжатия."""
+    from weaviate.classes.config import Configure, Reconfigure
+
+    compression = _check_compression(compression)
+    quantizer = Reconfigure.VectorIndex.Quantizer if reconfigure else Configure.VectorIndex.Quantizer
+    if compression == "pq":
+        return quantizer.pq(
+            segments=PQ_SEGMENTS or None,
+            training_limit=PQ_TRAINING_LIMIT,
+        )
+    if compression == "bq":
+        return quantizer.bq()
+    return None
+
+
+def vector_index_config(
+    ef: int = HNSW_EF,
+    ef_construction: int = HNSW_EF_CONSTRUCTION,
+    max_connections: int = HNSW_MAX_CONNECTIONS,
+    compression: str = VECTOR_COMPRESSION,
+):
+    from weaviate.classes.config import Configure
+
+    return Configure.VectorIndex.hnsw(
+        ef=ef,
+        ef_construction=ef_construction,
+        max_connections=max_connections,
+        quantizer=quantizer_config(compression),
+    )
+
+
+def vectorizer_config(**index_options):
+    from weaviate.classes.config import Configure
+
+    return [
+        Configure.NamedVectors.text2vec_ollama(
+            name=VECTOR_NAME,
+            source_properties=["text"],
+            api_endpoint=OLLAMA_ENDPOINT,
+            model=EMBEDDING_MODEL,
+            vector_index_config=vector_index_config(**index_options),
+        )
+    ]
+
+
+def create_collection(client, name: str = CLASS_NAME, **index_options) -> bool:
+    """
+    Создаёт коллекцию, если её ещё нет. Возвращает True, если коллекция создана.
+    index_options — ef, ef_construction, max_connections, compression.
+    """
+    if client.collections.exists(name):
+        logger.info(f"📚 Коллекция {name} уже существует.")
+        return False
+    client.collections.create(
+        name,
+        description="Collection for storing book excerpts with semantic search",
+        properties=properties(),
+        vectorizer_config=vectorizer_config(**index_options),
+    )
+    logger.info(f"✅ Коллекция {name} успешно создана.")
+    return True
+
+
+def update_vector_index(client, name: str = CLASS_NAME, ef: Optional[int] = None, compression: Optional[str] = None):
+    """
+    Меняет изменяемые параметры индекса на существующей коллекции:
+    ef и включение сжатия (выключить сжатие Weaviate не позволяет).
+    """
+    options = {}
+    if ef is not None:
+        options["ef"] = ef
+    if compression is not None and _check_compression(compression) != "none":
+        options["quantizer"] = quantizer_config(compression, reconfigure=True)
+    if not options:
+        return
+    from weaviate.classes.config import Reconfigure
+
+    client.collections.get(name).config.update(
+        vectorizer_config=[
+            Reconfigure.NamedVectors.update(
+                name=VECTOR_NAME,
+                vector_index_config=Reconfigure.VectorIndex.hnsw(**options),
+            )
+        ]
+    )
+    logger.info(f"🔧 Индекс коллекции {name} обновлён: {options}")